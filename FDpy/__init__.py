@@ -1 +1 @@
-from .fd_problem import Fd_problem
+from .fd_problem import Fd_problem, Fd_spec
@@ -2,11 +2,37 @@
 """Define ExpressionList class which provides useful methods to create matrix/rhs."""
 
 
-from ..treenode import postvisitor, evaluate
+from ..treenode import postvisitor_all, evaluate, simplify
 from ..expressions import Symbol
+import numbers
 import numpy as np
 
 
+def _as_values(values):
+    """Store values in a numeric array, or in an object array if some of them are symbolic."""
+    if isinstance(values, np.ndarray) and values.dtype != object:
+        return values
+    values = list(values)
+    if all(isinstance(elem, numbers.Number) for elem in values):
+        return np.array(values)
+    array = np.empty(len(values), dtype=object)
+    for idx, elem in enumerate(values):  # Element-wise, numpy would try to iterate over Terminals
+        array[idx] = elem
+    return array
+
+
+def _theta(method_time):
+    """Return the weight of the implicit part of a scheme ("imp", "exp", "cn" or a number in [0, 1])."""
+    if isinstance(method_time, str):
+        try:
+            return {"imp": 1.0, "exp": 0.0, "cn": 0.5}[method_time]
+        except KeyError:
+            raise NotImplementedError(f"Only exp, imp, cn and theta methods implemented, not {method_time}")
+    if isinstance(method_time, numbers.Real) and 0 <= method_time <= 1:
+        return float(method_time)
+    raise NotImplementedError(f"A theta method needs a number between 0 and 1, not {method_time}")
+
+
 class ExpressionList:
     """
     A class to help in creating the matrix/rhs from a linear partial differential equation.
@@ -24,6 +50,15 @@ class ExpressionList:
         -1 for one stripe below, etc.). This is useful because linear PDEs can always be 
         represented by stripes in a matrix.
 
+    Attributes
+    ----------
+    offsets: np.ndarray
+        Sorted integer keys of expr_dict (positions wrt the diagonal).
+    values: np.ndarray
+        Corresponding values, a numeric array once evaluated and an object array
+        while some of them are Expressions. The arithmetic below works on these
+        arrays, expr_dict is built from them when accessed.
+
     Methods
     -------
     __str__(self):
@@ -40,9 +75,12 @@ class ExpressionList:
     __call__(self, val, symb):
         It will be common to have expressions in the values of the attribute. Calling the
         class will evaluate the symbols in the expressions (with names symb)
-        at the value specified (val).
+        at the value specified (val). Subexpressions shared between values are
+        evaluated once.
     __eq__(self, other):
         Define equality as equality in the values of attributes.
+    simplify(self):
+        Return an ExpressionList with simplified values (smaller trees to evaluate).
     clean(self):
         Remove all zero values (since these won't affect matrix add/sub)
     max_key(self):
@@ -51,11 +89,12 @@ class ExpressionList:
         Round all attribute values for test purposes.
     combine_x_and_t(self, other, method_time):
         Given ExpressionLists for x and t (self and other respectively), return 4
-        dicts, the first giving info on how the matrix should be filled, the
+        ExpressionLists (None for a missing rhs), the first giving info on how the matrix should be filled, the
         next 2 give info about the rhs terms (because of x and t terms respectively),
         and the last one about the boundary terms. The assumpiton is made that all the
         unknowns are move the the t-side of the equation, accoridngly, the rhs is the
-        x-side of the equation.
+        x-side of the equation. method_time is "imp", "exp", "cn" (Crank-Nicolson)
+        or the weight theta of the implicit part.
 
     See Also
     --------
@@ -66,6 +105,27 @@ class ExpressionList:
     def __init__(self, expr_dict):
         self.expr_dict = expr_dict
 
+    @classmethod
+    def _from_arrays(cls, offsets, values):
+        """Create an ExpressionList from sorted offsets and the corresponding values."""
+        new = cls.__new__(cls)
+        new.offsets = offsets
+        new.values = _as_values(values)
+        return new
+
+    @property
+    def expr_dict(self):
+        """Return the diagonals as a dict {offset: value}."""
+        return dict(zip(self.offsets.tolist(), self.values.tolist()))
+
+    @expr_dict.setter
+    def expr_dict(self, expr_dict):
+        keys = np.array(list(expr_dict.keys()), dtype=np.int64)
+        order = np.argsort(keys)
+        values = _as_values(expr_dict.values())
+        self.offsets = keys[order]
+        self.values = values[order]
+
     def __str__(self):
         """Return string representation of the attribute."""
         return str(self.expr_dict)
@@ -74,65 +134,83 @@ class ExpressionList:
         """Return string representation of the anme of the class and attribute."""
         return type(self).__name__ + repr(self.expr_dict)
 
+    def _spread(self, offsets):
+        """Return the values on offsets (sorted, containing self.offsets), 0 elsewhere."""
+        values = np.zeros(len(offsets), dtype=self.values.dtype)
+        values[np.searchsorted(offsets, self.offsets)] = self.values
+        return values
+
     def __add__(self, other):
         """Define addition between ExpressionLists."""
         if not isinstance(other, ExpressionList):
             raise NotImplementedError(f"Can not add a {type(other)} to an ExpressionList.")
-        d1 = self.expr_dict
-        d2 = other.expr_dict
-        d_added = {k_val: d1.get(k_val, 0) + d2.get(k_val, 0) for k_val in (d1.keys() | d2.keys())}
-        return ExpressionList(d_added)
+        offsets = np.union1d(self.offsets, other.offsets)
+        return ExpressionList._from_arrays(offsets, self._spread(offsets) + other._spread(offsets))
 
     def __mul__(self, other):
         """Define addition between an ExpressionList and a Number."""
         if not isinstance(other, (int, float)):
             raise NotImplementedError(f"Multiplication only defined for int, float, not {type(other)}.")
-        d1 = self.expr_dict
-        d_mul = {k: d1.get(k, 0) * other for k in (d1.keys())}
-        return ExpressionList(d_mul)
+        return ExpressionList._from_arrays(self.offsets, self.values * other)
 
     def __sub__(self, other):
         """Define substraction between ExpressionLists."""
-        d1 = self.expr_dict
-        d2 = other.expr_dict
-        d_sub = {k_val: d1.get(k_val, 0) - d2.get(k_val, 0) for k_val in (d1.keys() | d2.keys())}
-        return ExpressionList(d_sub)
+        offsets = np.union1d(self.offsets, other.offsets)
+        return ExpressionList._from_arrays(offsets, self._spread(offsets) - other._spread(offsets))
 
     def __truediv__(self, other):
         """Define division of ExpressionList by a Symbol (from Expressions class)."""
         if isinstance(other, Symbol):
-            d1 = self.expr_dict
-            d_div = {k: d1.get(k, 0) / other for k in (d1.keys())}
-            return ExpressionList(d_div)
+            return ExpressionList._from_arrays(self.offsets, self.values.astype(object) / other)
         else:
             raise NotImplementedError
 
     def __call__(self, val, symb):
         """Evaluate Expressions inside ExpressionList at a certain value."""
-        name = str(symb)
-        expr = self.expr_dict
-        expr = ExpressionList({k: postvisitor(expr.get(k), evaluate, symbol_map={name: val}) for k in expr.keys()})
+        values = self.values
+        if values.dtype == object:
+            values = postvisitor_all(values, evaluate, symbol_map={str(symb): val})
+        expr = ExpressionList._from_arrays(self.offsets, values)
         expr.clean()
         return expr
 
     def __eq__(self, other):
-        """Define equality between ExpressionLists."""
-        return self.expr_dict == other.expr_dict
+        """Define equality between ExpressionLists (or with a dict of diagonals)."""
+        if isinstance(other, dict):
+            other = ExpressionList(other)
+        if not isinstance(other, ExpressionList):
+            return NotImplemented
+        if not np.array_equal(self.offsets, other.offsets):
+            return False
+        if self.values.dtype != object and other.values.dtype != object:
+            return bool(np.array_equal(self.values, other.values))
+        return all(bool(v1 == v2) for v1, v2 in zip(self.values, other.values))
+
+    def simplify(self):
+        """Simplify the Expressions inside ExpressionList (see treenode.simplify)."""
+        if self.values.dtype != object:
+            return ExpressionList._from_arrays(self.offsets, self.values.copy())
+        return ExpressionList._from_arrays(self.offsets, postvisitor_all(self.values, simplify))
 
     def clean(self, val=0):
         """Remove zero values from attribute."""
-        self.expr_dict = {k: v for k, v in self.expr_dict.items() if v != val}
+        if self.values.dtype != object:
+            keep = self.values != val
+        else:
+            keep = np.array([bool(v != val) for v in self.values], dtype=bool)
+        self.offsets = self.offsets[keep]
+        self.values = self.values[keep]
 
     def max_key(self):
         """Return the largest key from attribute."""
-        return max(k for k, v in self.expr_dict.items())
+        return int(self.offsets.max())
 
     def round_vals(self):
         """Round values inside attributes."""
-        return ExpressionList({k: np.round(v) for k, v in self.expr_dict.items()})
+        return ExpressionList._from_arrays(self.offsets, [np.round(v) for v in self.values])
 
     def combine_x_and_t(self, other, method_time):
-        """Transform two ExpressionLists into useful dicts to define matrix/rhs.
+        """Transform two ExpressionLists into the ExpressionLists defining matrix/rhs.
 
         Example:
         -------
@@ -152,26 +230,26 @@ class ExpressionList:
             rhs_t = {0: 2} (Since the rhs is evaluated at j (key = 0))
             bc_x = {1: 1, -1: 1} (any term that is not on the diagonal will
                                     contribute for boundary conditions).
+
+        For a theta method (theta=0.5 for "cn"), the x terms are split between both sides:
+            mat_dict = t_max - theta * expr_x, rhs_x = (1 - theta) * expr_x
+        and bc_x is multiplied by theta (it only fills the matrix/rhs of the implicit part,
+        the explicit part needs the positions of the boundary points only).
         """
-        t_dict = other.expr_dict
-        k_max = max(k for k in t_dict.keys())
-        bc_x = self.expr_dict.copy()
-        try:
-            bc_x[0]
-            del bc_x[0]
-        except (KeyError):
-            pass
-        if method_time == "imp":
-            t_max = ExpressionList({0: t_dict.get(k_max)})
-            del t_dict[k_max]
-            rhs_t = {k: -v for k, v in t_dict.items()}
-            mat_dict = (t_max - self).expr_dict
+        k_max = other.max_key()
+        at_max = other.offsets == k_max
+        t_max = ExpressionList._from_arrays(np.zeros(1, dtype=np.int64), other.values[at_max])
+        rhs_t = ExpressionList._from_arrays(other.offsets[~at_max], -other.values[~at_max])
+        off_diag = self.offsets != 0
+        bc_x = ExpressionList._from_arrays(self.offsets[off_diag], self.values[off_diag])
+        theta = _theta(method_time)
+        if theta == 1:
+            mat_dict = t_max - self
             rhs_x = None
             return mat_dict, rhs_x, rhs_t, bc_x
-        elif method_time == "exp":
-            mat_dict = {0: t_dict.get(k_max)}
-            del t_dict[k_max]
-            rhs_t = {k: -v for k, v in t_dict.items()}
-            return mat_dict, self.expr_dict, rhs_t, bc_x
+        elif theta == 0:
+            return t_max, ExpressionList._from_arrays(self.offsets, self.values.copy()), rhs_t, bc_x
         else:
-            raise NotImplementedError(f"Only exp and imp methods implemented, not {method_time}")
+            mat_dict = t_max - ExpressionList._from_arrays(self.offsets, self.values * theta)
+            rhs_x = ExpressionList._from_arrays(self.offsets, self.values * (1 - theta))
+            return mat_dict, rhs_x, rhs_t, ExpressionList._from_arrays(bc_x.offsets, bc_x.values * theta)
@@ -1,5 +1,33 @@
 
 """Defines Expressions class and all its subclasses and their iterators."""
+import weakref
+
+# Every hashable node is unique: building the same symbol, number or subtree twice
+# returns the node already alive, which lets identical subtrees be shared.
+_INTERNED = weakref.WeakValueDictionary()
+
+
+def _intern_key(value):
+    """Return the key identifying an operand when interning, None if it is not hashable."""
+    if isinstance(value, Expressions):
+        return id(value)  # Operands are kept alive by the node using them
+    try:
+        hash(value)
+    except TypeError:
+        return None
+    return (type(value), value)
+
+
+def _intern(cls, key, **attributes):
+    """Return the node of class cls stored under key, create it if there is none."""
+    node = None if key is None else _INTERNED.get(key)
+    if node is None:
+        node = object.__new__(cls)
+        for name, value in attributes.items():
+            setattr(node, name, value)
+        if key is not None:
+            _INTERNED[key] = node
+    return node
 
 
 class Expressions:
@@ -17,10 +45,19 @@ class Expressions:
     See Also
     --------
     class TreeNode : Create and evaluate trees of expressions.
+
+    Notes
+    -----
+    Nodes are immutable and interned: Symbol("x") is Symbol("x"), and the same
+    operator applied to the same operands returns the same node. Nodes hash
+    structurally so they can be used as dictionary keys.
     """
 
-    def __init__(self, operands: tuple):
-        self.operands = operands
+    __slots__ = ("operands", "_hash", "__weakref__")
+
+    def __reduce__(self):
+        """Pickle only the arguments of __new__, the cached hash depends on the process (hash seed)."""
+        return (type(self), self.__getnewargs__())
 
     def __add__(self, other):
         """Define the sum of two expressions."""
@@ -72,6 +109,56 @@ class Expressions:
         other = Number(other)
         return Pow((other, self))
 
+    def compile(self):
+        """Lower the expression into a Python function evaluating it from a symbol map.
+
+        The tree is walked only once, the function returned executes flat code
+        (one line per operator, shared subtrees computed once) and gives the same
+        result as postvisitor(expr, evaluate, symbol_map=symbol_map). Symbols can
+        be mapped to numbers or NumPy arrays.
+
+        Examples
+        --------
+        >>> x = Symbol("x")
+        >>> f = (2 * x + 1).compile()
+        >>> f({"x": np.arange(3)})
+        array([1, 3, 5])
+        """
+        namespace = {}
+        names = {}  # Variable name of every node visited
+        symbols = {}
+        lines = []
+        stack = [(self, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if id(node) in names:
+                continue
+            if isinstance(node, Symbol):
+                if node.value not in symbols:
+                    symbols[node.value] = f"_s{len(symbols)}"
+                names[id(node)] = symbols[node.value]
+            elif not isinstance(node, Operator):
+                name = f"_c{len(namespace)}"
+                namespace[name] = node.value if isinstance(node, Number) else node
+                names[id(node)] = name
+            elif children_done:
+                operand1, operand2 = (names[id(elem)] for elem in node.operands)
+                names[id(node)] = f"_t{len(lines)}"
+                lines.append(f"{names[id(node)]} = {operand1} {_PY_OPERATORS[type(node)]} {operand2}")
+            else:
+                stack.append((node, True))
+                stack.extend((elem, False) for elem in reversed(node.operands))
+        source = "\n    ".join(
+            ["def _compiled(symbol_map):"]
+            + [f"{var} = symbol_map[{value!r}]" for value, var in symbols.items()]
+            + lines
+            + [f"return {names[id(self)]}"]
+        )
+        exec(source, namespace)
+        compiled = namespace["_compiled"]
+        compiled.source = source
+        return compiled
+
 
 class Operator(Expressions):
     """Subclass to represent Operators.
@@ -87,6 +174,41 @@ class Operator(Expressions):
         Return string representaion of the equation.
     """
 
+    __slots__ = ()
+
+    def __new__(cls, operands: tuple):
+        """Return the interned node applying the operator to operands (created if needed)."""
+        operands = tuple(operands)
+        keys = tuple(_intern_key(elem) for elem in operands)
+        node = _intern(cls, None if None in keys else (cls, keys), operands=operands)
+        if not hasattr(node, "_hash"):
+            try:
+                node._hash = hash((cls, operands))
+            except TypeError:
+                pass  # Operands such as arrays, the node is not hashable
+        return node
+
+    def __getnewargs__(self):
+        """Arguments given to __new__ when unpickling."""
+        return (self.operands,)
+
+    def __eq__(self, other):
+        """Compare two expressions structurally."""
+        if self is other:
+            return True
+        if not isinstance(other, Expressions):
+            return NotImplemented
+        return type(self) is type(other) and all(
+            elem is other_elem or elem == other_elem for elem, other_elem in zip(self.operands, other.operands)
+        )
+
+    def __hash__(self):
+        """Hash structurally, computed once when the node is created."""
+        try:
+            return self._hash
+        except AttributeError:
+            raise TypeError(f"unhashable {type(self).__name__}: it has unhashable operands") from None
+
     def __repr__(self):
         """Represent as string for debugging and other purposes."""
         return type(self).__name__ + repr(self.operands)
@@ -155,48 +277,47 @@ class Operator(Expressions):
 class Add(Operator):
     """Subclass to add two operands."""
 
-    def __init__(self, operands: tuple):
-        super().__init__(operands)
-        self.symbol = "+"
-        self.precedence = 1
+    __slots__ = ()
+    symbol = "+"
+    precedence = 1
 
 
 class Sub(Operator):
     """Subclass to substract two operands."""
 
-    def __init__(self, operands: tuple):
-        super().__init__(operands)
-        self.symbol = "-"
-        self.precedence = 1
+    __slots__ = ()
+    symbol = "-"
+    precedence = 1
 
 
 class Mul(Operator):
     """Subclass to multiply two operands."""
 
-    def __init__(self, operands: tuple):
-        super().__init__(operands)
-        self.symbol = "*"
-        self.precedence = 2
+    __slots__ = ()
+    symbol = "*"
+    precedence = 2
 
 
 class Div(Operator):
     """Subclass to divide two operands."""
 
-    def __init__(self, operands: tuple):
-        super().__init__(operands)
-        self.symbol = "/"
-        self.precedence = 2
-        if self.operands[1] == 0:
+    __slots__ = ()
+    symbol = "/"
+    precedence = 2
+
+    def __new__(cls, operands: tuple):
+        """Return the interned division node, dividing by zero raises ZeroDivisionError."""
+        if operands[1] == 0:
             raise ZeroDivisionError
+        return super().__new__(cls, operands)
 
 
 class Pow(Operator):
     """Subclass to use power on operands."""
 
-    def __init__(self, operands: tuple):
-        super().__init__(operands)
-        self.symbol = "^"
-        self.precedence = 3
+    __slots__ = ()
+    symbol = "^"
+    precedence = 3
 
 
 class Terminal(Expressions):
@@ -210,10 +331,17 @@ class Terminal(Expressions):
         Depending if it is a symbol or a number
     """
 
-    def __init__(self, operands: tuple, value):
-        super().__init__(operands)
-        self.value = value
-        self.precedence = 5
+    __slots__ = ("value",)
+    precedence = 5
+
+    def __new__(cls, operands: tuple, value):
+        """Return the interned terminal node holding value (created if needed)."""
+        key = _intern_key(value)
+        return _intern(cls, None if key is None else (cls, key), operands=tuple(operands), value=value)
+
+    def __getnewargs__(self):
+        """Arguments given to __new__ when unpickling."""
+        return (self.operands, self.value)
 
     def __str__(self):
         """Represent symbols/numbers when printing."""
@@ -234,19 +362,37 @@ class Terminal(Expressions):
         else:
             return self.value == other.value
 
+    def __hash__(self):
+        """Hash as the value, consistent with the equality above."""
+        return hash(self.value)
+
 
 class Symbol(Terminal):
     """Subclass representing symbols."""
 
-    def __init__(self, value, operands=[]):
-        super().__init__(operands, value)
+    __slots__ = ()
+
+    def __new__(cls, value, operands=()):
+        """Return the interned symbol named value."""
+        return super().__new__(cls, operands, value)
+
+    def __getnewargs__(self):
+        """Arguments given to __new__ when unpickling."""
+        return (self.value,)
 
 
 class Number(Terminal):
     """Subclass representing numbers."""
 
-    def __init__(self, value, operands=[]):
-        super().__init__(operands, value)
+    __slots__ = ()
+
+    def __new__(cls, value, operands=()):
+        """Return the interned number of value."""
+        return super().__new__(cls, operands, value)
+
+    def __getnewargs__(self):
+        """Arguments given to __new__ when unpickling."""
+        return (self.value,)
 
 
 class TerminalIterator:
@@ -272,3 +418,6 @@ class TerminalIterator:
             raise StopIteration
         self.stop = 1
         return self.operands
+
+
+_PY_OPERATORS = {Add: "+", Sub: "-", Mul: "*", Div: "/", Pow: "**"}
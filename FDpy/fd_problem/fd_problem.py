@@ -3,12 +3,103 @@
 
 from ..utils import utils
 import numpy as np
-from scipy.sparse import diags
-from scipy.linalg import solve
+from numpy.lib import format as npy_format
+from numpy.lib.format import open_memmap
+from scipy.sparse import diags, csr_matrix, dok_matrix, identity, vstack
+from ..solvers import BandedLU, KrylovSolver, StencilOperator, CirculantSolver, DiagonalSolver
 from ..post_processing import start_animation
 from collections import deque
+from itertools import chain
 from ..treenode import postvisitor, evaluate
 from ..expressions import Expressions
+from ..expressionlist import ExpressionList
+from ..expressionlist.expressionlist import _theta
+
+
+# Steps between two checks that the solution is still finite (unstable schemes blow up)
+_FINITE_CHECK_EVERY = 100
+
+
+def _truncate_npy(path, rows):
+    """Keep the first rows of the array stored in the .npy file path, in place.
+
+    The shape in the header is rewritten (padded to the same length, so the data does
+    not move) and the file is truncated after the last row kept, nothing is copied.
+    """
+    with open(path, "r+b") as file:
+        version = npy_format.read_magic(file)
+        read_header = npy_format.read_array_header_1_0 if version == (1, 0) else npy_format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(file)
+        offset = file.tell()
+        start = 10 if version == (1, 0) else 12  # Magic string, version and length of the header
+        header = repr(
+            {"descr": npy_format.dtype_to_descr(dtype), "fortran_order": fortran_order, "shape": (rows,) + shape[1:]}
+        )
+        file.seek(start)
+        file.write((header.ljust(offset - start - 1) + "\n").encode("latin1"))
+        file.truncate(offset + rows * int(np.prod(shape[1:], dtype=int)) * dtype.itemsize)
+
+
+class Fd_spec:
+    """
+    A serializable specification of a finite difference problem (the inputs of Fd_problem).
+
+    Contrary to Fd_problem, it holds no derived state (mesh, solution history, ...),
+    so it is cheap to pickle and to send to other processes. The problem is built
+    with Fd_problem.from_spec(spec), and Fd_problem.to_spec() goes the other way.
+
+    Parameters
+    ----------
+    Same as Fd_problem.
+    """
+
+    __slots__ = (
+        "domain",
+        "interval",
+        "equation",
+        "boundary",
+        "initial",
+        "dx",
+        "dt",
+        "method_fd",
+        "method",
+        "bc_map",
+        "periodic",
+    )
+
+    def __init__(
+        self,
+        domain: list,
+        interval: list,
+        equation: list,
+        boundary=None,
+        initial=None,
+        dx=0.1,
+        dt=0.1,
+        method_fd="imp",
+        method=["cen", "for"],
+        bc_map=None,
+        periodic=False,
+    ):
+        self.domain = domain
+        self.interval = interval
+        self.equation = equation
+        self.boundary = boundary
+        self.initial = initial
+        self.dx = dx
+        self.dt = dt
+        self.method_fd = method_fd
+        self.method = method
+        self.bc_map = bc_map
+        self.periodic = periodic
+
+    def __repr__(self):
+        """Represent the specification by its arguments."""
+        return type(self).__name__ + "(" + ", ".join(f"{k}={v!r}" for k, v in self.kwargs().items()) + ")"
+
+    def kwargs(self):
+        """Return the keyword arguments of Fd_problem."""
+        return {name: getattr(self, name) for name in self.__slots__}
 
 
 class Fd_problem:
@@ -39,18 +130,42 @@ class Fd_problem:
     dt: float,
         Time step
     method_fd: str,
-        Method of finite difference, "imp" for implicit, "exp" for explicit.
+        Method of finite difference, "imp" for implicit, "exp" for explicit,
+        "cn" for Crank-Nicolson or a number theta in [0, 1] for a theta method
+        (theta * implicit + (1 - theta) * explicit space terms). "cn" is second
+        order in time with acc_t=1 and allows far larger time steps than "exp".
         Note: Explicit schemes have not been heavily tested yet. Please use
         implicit schemes for guaranteed results.
     methods_xt: list of two str lists (check example for more details)
         Specifies methods for approx. derivatives ("for" for forward,
         "bac" for backward, "cen" for center) in both space/time.
+    periodic: bool,
+        If True, the domain is periodic (u(domain[1]) = u(domain[0])) and no boundary
+        conditions are needed. The unknowns are at x = domain[0] + i*dx for i < Nx,
+        the circulant system is solved by FFT at every step.
 
     Methods
     -------
-    forward_in_time(self, verbose=False, sanity=False, acc_x=2, acc_t=1):
+    from_spec(cls, spec):
+        Build the problem from a specification (see Fd_spec).
+    to_spec(self):
+        Return the specification of the problem, without any derived state or solution.
+    forward_in_time(self, verbose=False, sanity=False, acc_x=2, acc_t=1, memmap=None, save_every=1,
+                    output_times=None, steady_tol=None, steady_window=1, initial=None, bc_constants=None,
+                    solver="lu", solver_options=None):
         Use the problem defined and solves it on the time interval specified. The solution is returned
-        in a form of matrix of points in space and time.
+        in a form of matrix of points in time and space (array of shape (Nt, Nx)), the corresponding
+        times are stored in self.times. A batch of initial conditions/boundary constants can be solved
+        at once.
+    iter_steps(self, acc_x=2, acc_t=1, verbose=False, steady_tol=None, steady_window=1, initial=None,
+               bc_constants=None, solver="lu", solver_options=None):
+        Generator yielding (t, u) at every time step without keeping the solution history.
+    march(self, callback, acc_x=2, acc_t=1, verbose=False):
+        Call callback(t, u) at every time step until it returns True.
+    solve_at(self, t, acc_x=2, acc_t=1, verbose=False):
+        Return the solution at a single time using powers of the step propagator.
+    solve_steady(self, acc_x=2, verbose=False):
+        Solve the problem without time derivatives (steady state) directly.
     post_process(self,mat_u,exact=None,reduce_frame=1,interval=300,xlabel="X",ylabel="U",label="Approx.",
                     exact_label="Exact",xlim=None,ylim=None,fps=30,save=False,
                     filename=None,error=False,anim=True,jup=False)
@@ -70,6 +185,7 @@ class Fd_problem:
         method_fd="imp",
         method=["cen", "for"],
         bc_map=None,
+        periodic=False,
     ):
         self.domain = domain
         self.equation = equation
@@ -84,32 +200,48 @@ class Fd_problem:
             self.boundary = [elem if isinstance(elem, tuple) else range(elem, elem + 1) for elem in boundary]
         else:
             self.boundary = None
-        try:
-            len(initial)
-        except TypeError:
-            if initial is not None:
-                initial = [initial]
-        if boundary is not None:
+        self.periodic = periodic
+        if boundary is not None or periodic:
             self.Nx = self._create_mesh()
-        if initial is not None:
-            self.initial = [np.ones(self.Nx) * elem if isinstance(elem, (int, float)) else elem for elem in initial]
-            self.initial = [
-                postvisitor(
-                    elem,
-                    evaluate,
-                    symbol_map={"x": np.linspace(self.domain[0] + self.dx, self.domain[1] - self.dx, self.Nx)},
-                )
-                if isinstance(elem, Expressions)
-                else elem
-                for elem in self.initial
-            ]
-        else:
-            self.initial = None
+        self.initial = self._normalize_initial(initial) if initial is not None else None
         self.method = method
         self.method_fd = method_fd
         self.bc_map = bc_map
         self._check_input()
         self.solution = []
+        self.times = None
+        self.stop_time = None
+        self.iterations = None
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Build the problem from a specification (see Fd_spec)."""
+        return cls(**spec.kwargs())
+
+    def to_spec(self):
+        """Return the specification of the problem (see Fd_spec), its solution is not included."""
+        boundary = self.boundary
+        if boundary is not None:
+            boundary = [elem[0] if isinstance(elem, range) else elem for elem in boundary]
+        return Fd_spec(
+            self.domain,
+            self.interval,
+            self.equation,
+            boundary,
+            self.initial,
+            self.dx,
+            self.dt,
+            self.method_fd,
+            self.method,
+            self.bc_map,
+            self.periodic,
+        )
+
+    def __getstate__(self):
+        """Pickle the problem without its solution history."""
+        state = self.__dict__.copy()
+        state.update(solution=[], times=None, stop_time=None)
+        return state
 
     def __str__(self):
         """Return string representation of the equation to be solved."""
@@ -132,6 +264,8 @@ class Fd_problem:
             raise ValueError("Provide domain in increasing order.")
         if len(self.interval) != 2:
             raise ValueError("Interval must be of len 2")
+        if self.periodic and self.boundary is not None:
+            raise ValueError("Periodic problems do not need boundary conditions.")
         if self.initial is not None:
             for elem in self.initial:
                 if not isinstance(elem, np.ndarray) and not isinstance(elem, tuple):
@@ -144,15 +278,14 @@ class Fd_problem:
                     raise NotImplementedError(f"Initial conditions can not depend on element {len(elem)-1} (unknown).")
         if (self.equation[0])[-1] == 0 or (self.equation[1])[-1] == 0:
             raise ValueError("0 is not expected as last entry, did you write the equation in the right way?")
-        if self.method_fd != "imp" and self.method_fd != "exp":
-            raise NotImplementedError(f"Only imp and exp are imlemented as method_fd, not {self.method_fd}.")
+        _theta(self.method_fd)  # Raises NotImplementedError for unknown methods
         if len(self.method) != 2:
             raise ValueError("Method should be an array of strings of length 2. Do not specify for default option.")
         if self.method[0] != "for" and self.method[0] != "bac" and self.method[0] != "cen":
             raise ValueError("Entry 0 of method can only be for, bac, or cen in a string.")
         if self.method[1] != "for" and self.method[1] != "bac" and self.method[1] != "cen":
             raise ValueError("Entry 1 of method can only be for, bac, or cen in a string.")
-        if after:
+        if after and not self.periodic:
             if self.bc_map is None or len(self.bc_map) != len(self.boundary):
                 raise ValueError("Something went wrong with bc_map, did you provide it?")
             if len(self.equation[0]) < 2 or len(self.equation[1]) < 2:
@@ -161,54 +294,125 @@ class Fd_problem:
                 if len(elem) >= self.Nx + 1:
                     raise ValueError("Boundary conditions can not depend on boundary conditions on the other side.")
 
+    def _normalize_initial(self, initial):
+        """Evaluate initial conditions given as numbers or Expressions at the inner points."""
+        try:
+            len(initial)
+        except TypeError:
+            initial = [initial]
+        initial = [np.ones(self.Nx) * elem if isinstance(elem, (int, float)) else elem for elem in initial]
+        if not any(isinstance(elem, Expressions) for elem in initial):
+            return initial  # Nothing to evaluate, the mesh might not be known yet (no boundary conditions)
+        if self.periodic:
+            x_vec = self.domain[0] + self.dx * np.arange(self.Nx)
+        else:
+            x_vec = np.linspace(self.domain[0] + self.dx, self.domain[1] - self.dx, self.Nx)
+        return [
+            postvisitor(elem, evaluate, symbol_map={"x": x_vec}) if isinstance(elem, Expressions) else elem
+            for elem in initial
+        ]
+
     def _create_mesh(self):
         """Create a mesh by specifying start, end points and number of inner points."""
         x0 = self.domain[0]
         xf = self.domain[1]
+        if self.periodic:  # The point at xf is the one at x0
+            Nx = int(np.round((xf - x0) / self.dx))
+            self.dx = (xf - x0) / Nx
+            return Nx
         Nx = int(np.round((xf - x0) / self.dx - 1))
         self.dx = (xf - x0) / (Nx + 1)
         return Nx + (2 - len(self.boundary))
 
-    def _create_rhs(self, rhs_x, rhs_t, bc_x, prev_times):
-        """Create the rhs from previously computed values."""
-        rhs_val = np.zeros(self.Nx)
-        node_vals_t = rhs_t[1]
-        for count in range(len(rhs_t[0])):
-            rhs_val += prev_times[count] * node_vals_t[count]
-        if rhs_x is not None:  # for explicit, not implemented yet
-            node_vals_x = rhs_x[1]
-            prev_at_m = prev_times[np.where(rhs_t[0] == 0)[0][0]]
-            p = sum(bc_x[0] > 0)
-            n = sum(bc_x[0] < 0)
-            left_vals = []
-            right_vals = []
-            for idx in bc_x[0]:
-                loc = idx + n if idx < 0 else idx - (p + 1)
-                find = int(np.where(self.bc_map == loc)[0][0])
-                if find == []:
-                    raise ValueError(
-                        "bc_map do not correspond to the right boundary conditions. Run self.info() for help."
-                    )
-                to_mult = self.boundary[find][0]
-                for counter, dummy in enumerate(self.boundary[find][1:]):
-                    count = counter if idx < 0 else -(counter + 1)
-                    to_mult += dummy * prev_at_m[count]
-                if idx < 0:
-                    left_vals.append(to_mult)
-                else:
-                    right_vals.append(to_mult)
-            prev_at_m = np.hstack((left_vals, prev_at_m, right_vals))
-            for count, elem in enumerate(rhs_x[0]):
-                elem = int(elem)
-                end = -len(right_vals) + elem
-                if end == 0:
-                    rhs_val += prev_at_m[len(left_vals) + elem :] * node_vals_x[count]
-                else:
-                    rhs_val += prev_at_m[len(left_vals) + elem : -len(right_vals) + elem] * node_vals_x[count]
+    def _create_rhs(self, rhs_t, explicit_op, prev_times):
+        """Create the rhs from previously computed values.
+
+        The boundary terms are not added here, they are a constant vector computed
+        once by _assemble. The explicit part of the scheme (terms in x at the previous
+        time step) is a single sparse product with explicit_op (see _explicit_operator).
+        The previous times can be of shape (Nx,) or (Nx, batch).
+        """
+        if explicit_op is not None:
+            rhs_val = explicit_op @ prev_times[np.where(rhs_t[0] == 0)[0][0]]
+        else:
+            rhs_val = np.zeros(np.shape(prev_times[0]))
+        for count, val in enumerate(rhs_t[1]):
+            if val != 0:
+                rhs_val += prev_times[count] * val
         return rhs_val
 
-    def _implement_bc(self, matrix, rhs, bc_x, first):
-        """Implement the boundary conditions by adding required entries to matrix/rhs."""
+    def _explicit_operator(self, rhs_x, rhs_t, bc_x, boundaries=None):
+        """Compile the explicit part of the scheme into a sparse operator acting on the previous time step.
+
+        The stencil rhs_x is applied to the inner points extended by the points outside
+        the domain (given by _ghost_operator, or wrapped around on periodic domains), the
+        term of rhs_t at the previous time step is added to the diagonal.
+
+        Returns
+        -------
+        op : scipy.sparse.csr_matrix of shape (Nx, Nx)
+            Dependence of the rhs on the previous time step.
+        const : np.ndarray of shape (Nx,) or (Nx, batch)
+            Constant terms coming from the boundary conditions (one column per member
+            of boundaries if given).
+        """
+        offsets = rhs_x[0].astype(int)
+        at_m = rhs_t[1][rhs_t[0] == 0][0] * identity(self.Nx, format="csr")
+        if self.periodic:
+            rows = np.tile(np.arange(self.Nx), len(offsets))
+            cols = (rows + np.repeat(offsets, self.Nx)) % self.Nx
+            op = csr_matrix((np.repeat(rhs_x[1], self.Nx), (rows, cols)), shape=(self.Nx, self.Nx))
+            return op + at_m, np.zeros(self.Nx)
+        ghost_mat, ghost_const, n = self._ghost_operator(bc_x)
+        if boundaries is not None:
+            ghost_const = np.stack([self._ghost_operator(bc_x, elem)[1] for elem in boundaries], axis=-1)
+        p = ghost_mat.shape[0] - n
+        stencil = diags(rhs_x[1], offsets + n, shape=(self.Nx, n + self.Nx + p), format="csr")
+        extend = vstack((ghost_mat[:n], identity(self.Nx), ghost_mat[n:]), format="csr")
+        zeros = np.zeros((self.Nx,) + ghost_const.shape[1:])
+        const = stencil @ np.concatenate((ghost_const[:n], zeros, ghost_const[n:]))
+        return (stencil @ extend).tocsr() + at_m, const
+
+    def _ghost_operator(self, bc_x, boundary=None):
+        """Compile the boundary conditions into a sparse operator giving the points outside the domain.
+
+        The boundary conditions used are self.boundary unless others are given.
+
+        Returns
+        -------
+        ghost_mat : scipy.sparse matrix of shape (n + p, Nx)
+            Dependence of the boundary points on the inner points.
+        ghost_const : np.ndarray of shape (n + p,)
+            Constant terms of the boundary conditions.
+        n : int
+            Number of boundary points on the left (the first n rows), the
+            remaining p rows are the points on the right.
+        """
+        boundary = self.boundary if boundary is None else boundary
+        p = int(sum(bc_x[0] > 0))
+        n = int(sum(bc_x[0] < 0))
+        rows, cols, vals = [], [], []
+        ghost_const = np.zeros(n + p)
+        for idx in bc_x[0].astype(int):
+            loc = idx + n if idx < 0 else idx - (p + 1)
+            find = np.where(np.asarray(self.bc_map) == loc)[0]
+            if len(find) == 0:
+                raise ValueError("bc_map do not correspond to the right boundary conditions. Run self.info() for help.")
+            row = loc if idx < 0 else n + idx - 1
+            ghost_const[row] = boundary[find[0]][0]
+            for counter, dummy in enumerate(boundary[find[0]][1:]):
+                rows.append(row)
+                cols.append(counter if idx < 0 else self.Nx - (counter + 1))
+                vals.append(dummy)
+        ghost_mat = csr_matrix((vals, (rows, cols)), shape=(n + p, self.Nx))
+        return ghost_mat, ghost_const, n
+
+    def _implement_bc(self, matrix, rhs, bc_x, first, boundary=None):
+        """Implement the boundary conditions by adding required entries to matrix/rhs.
+
+        The boundary conditions used are self.boundary unless others are given.
+        """
+        boundary = self.boundary if boundary is None else boundary
         node_vals_x = bc_x[1]
         for count, val in enumerate(bc_x[0]):
             val = int(val)
@@ -230,35 +434,43 @@ class Fd_problem:
             for idx in range(start, finish + 1, -1):
                 find = np.where(self.bc_map == chosen)[0][0]
                 try:
-                    rhs[swap * idx] += node_vals_x[count] * self.boundary[find][0]
+                    rhs[swap * idx] += node_vals_x[count] * boundary[find][0]
                 except IndexError:
                     raise ValueError("Wrong BCs were provided, did you provide a bc_map?")
                 if first:
-                    for idx2 in range(len(self.boundary[find]) - 1):
+                    for idx2 in range(len(boundary[find]) - 1):
                         new_idx = -(idx2 + 1) if swap == -1 else idx2
-                        matrix[swap * idx, new_idx] += -node_vals_x[count] * self.boundary[find][idx2 + 1]
+                        matrix[swap * idx, new_idx] += -node_vals_x[count] * boundary[find][idx2 + 1]
                 chosen += -swap
         return rhs, matrix
 
-    def _init_rhs(self):
-        """Transform the initial conditions to the rhs of the matrix system."""
-        res = np.zeros((len(self.initial), self.Nx))
-        for point in range(self.Nx):
-            M = np.diag(np.ones(len(self.initial)))
-            b = np.zeros(len(self.initial))
-            for count, elem in enumerate(self.initial):
-                if isinstance(elem, np.ndarray):
-                    b[count] = elem[point]
-                elif isinstance(elem, tuple):
-                    b[count] = elem[0]
-                    for count2, elem2 in enumerate(elem[1:]):
-                        M[count, count2] += -elem2
-            try:
-                x = np.linalg.solve(M, b)
-            except ValueError:
-                raise ValueError("Initial conditions are not enough. Did you provide independent equations?")
-            res[:, point] = x
-        return res
+    def _init_rhs(self, initial=None):
+        """Transform the initial conditions to the rhs of the matrix system.
+
+        The system linking the initial conditions is the same at every point, it is
+        solved once for all points (one column of the rhs per point). If a batch of
+        initial conditions is given (one list per member), the result is of shape
+        (number of initial conditions, Nx, batch).
+        """
+        if initial is not None:
+            return np.stack([self._solve_initial(self._normalize_initial(member)) for member in initial], axis=-1)
+        return self._solve_initial(self.initial)
+
+    def _solve_initial(self, initial):
+        """Solve the system linking the initial conditions (see _init_rhs)."""
+        M = np.diag(np.ones(len(initial)))
+        b = np.zeros((len(initial), self.Nx))
+        for count, elem in enumerate(initial):
+            if isinstance(elem, np.ndarray):
+                b[count] = elem
+            elif isinstance(elem, tuple):
+                b[count] = elem[0]
+                for count2, elem2 in enumerate(elem[1:]):
+                    M[count, count2] += -elem2
+        try:
+            return np.linalg.solve(M, b)
+        except ValueError:
+            raise ValueError("Initial conditions are not enough. Did you provide independent equations?")
 
     def info(self, acc_x=2, acc_t=1):
         """Provide Information about boundary/initial conditions needed."""
@@ -288,29 +500,35 @@ class Fd_problem:
             self.boundary = [range(boundary, boundary + 1)]
         elif boundary is not None:
             self.boundary = [elem if isinstance(elem, tuple) else range(elem, elem + 1) for elem in boundary]
-        try:
-            len(initial)
-        except TypeError:
-            if initial is not None:
-                initial = [initial]
         self.Nx = self._create_mesh()
         if initial is not None:
-            self.initial = [np.ones(self.Nx) * elem if isinstance(elem, (int, float)) else elem for elem in initial]
-            self.initial = [
-                postvisitor(
-                    elem,
-                    evaluate,
-                    symbol_map={"x": np.linspace(self.domain[0] + self.dx, self.domain[1] - self.dx, self.Nx)},
-                )
-                if isinstance(elem, Expressions)
-                else elem
-                for elem in self.initial
-            ]
+            self.initial = self._normalize_initial(initial)
         self.bc_map = bc_map
         self._check_input(after=True)
 
-    def forward_in_time(self, verbose=False, sanity=False, acc_x=2, acc_t=1):
-        """Step in time to find solution at all times."""
+    def _time_steps(self):
+        """Return the times of the solution, the initial one followed by the ones computed when marching."""
+        start = self.interval[0] + self.dt * (len(self.equation[1]) - 2)
+        marching = np.arange(start, self.interval[1] + self.dt, self.dt)
+        return np.hstack((self.interval[0], marching))
+
+    def _saved_steps(self, times, save_every=1, output_times=None):
+        """Return the indices of the time steps to be kept in the solution."""
+        if output_times is None:
+            if int(save_every) != save_every or save_every < 1:
+                raise ValueError(f"save_every should be a positive integer, not {save_every}.")
+            return np.arange(0, len(times), int(save_every))
+        if save_every != 1:
+            raise ValueError("Specify either save_every or output_times, not both.")
+        output_times = np.atleast_1d(output_times)
+        if np.any(output_times < times[0] - self.dt / 2) or np.any(output_times > times[-1] + self.dt / 2):
+            raise ValueError(f"Output times should be in the interval [{times[0]}, {times[-1]}].")
+        idx = np.clip(np.searchsorted(times, output_times), 1, len(times) - 1)
+        idx -= (output_times - times[idx - 1]) < (times[idx] - output_times)  # Choose the closest time step
+        return np.unique(idx)
+
+    def _discretize(self, acc_x=2, acc_t=1, verbose=False):
+        """Approximate the equation by finite differences, see utils._exprlist_to_mat for the output."""
         mat_entries, expr_x, expr_t = utils._equ_to_exprlist(
             self.equation,
             acc_x,
@@ -323,35 +541,326 @@ class Fd_problem:
             verbose=verbose,
         )
         mat, rhs_x, rhs_t, bc_x = utils._exprlist_to_mat(mat_entries, self.method_fd)
+        return mat, rhs_x, rhs_t, bc_x, expr_x, expr_t
 
-        if sanity:
-            return bc_x, rhs_t, expr_x, expr_t
-        if len(self.boundary) != len(bc_x[0]):
+    def _batch_boundaries(self, bc_constants):
+        """Return the boundary conditions of every member of a batch (constant terms replaced)."""
+        bc_constants = np.asarray(bc_constants, dtype=float)
+        if bc_constants.ndim != 2 or bc_constants.shape[1] != len(self.boundary):
+            raise ValueError(
+                f"bc_constants should be of shape (batch, {len(self.boundary)}), not {bc_constants.shape}."
+            )
+        return [[(const,) + tuple(elem[1:]) for elem, const in zip(self.boundary, row)] for row in bc_constants]
+
+    def _assemble(self, acc_x=2, acc_t=1, verbose=False, bc_constants=None, solver="lu", solver_options=None):
+        """Build the linear solver and the operators needed to create the rhs at every step.
+
+        If bc_constants is given, the boundary terms are of shape (..., batch), one column
+        per row of bc_constants (see _batch_boundaries). The solver is a BandedLU for "lu",
+        or a KrylovSolver for "gmres"/"bicgstab" (solver_options are given to it), applying
+        the stencil matrix-free (see StencilOperator).
+        """
+        if solver != "lu" and solver not in ("gmres", "bicgstab"):
+            raise ValueError(f"Only lu, gmres and bicgstab are implemented as solvers, not {solver}.")
+        mat, rhs_x, rhs_t, bc_x, _, _ = self._discretize(acc_x, acc_t, verbose)
+        if self.periodic:  # Circulant matrix, no boundary terms
+            if bc_constants is not None:
+                raise ValueError("Periodic problems have no boundary conditions, bc_constants can not be given.")
+            if solver != "lu":
+                raise NotImplementedError("Periodic problems are solved by FFT, only the default solver can be used.")
+        elif len(self.boundary) != len(bc_x[0]):
             raise ValueError("Wrong number of boundary conditions. Run self.bc_info for more details.")
-        if len(self.initial) != len(rhs_t[0]):
-            raise ValueError("Wrong number of initial conditions. Run self.bc_info for more details.")
 
-        matrix = diags(mat[1], mat[0].astype(int), shape=(self.Nx, self.Nx)).toarray()
-        first = True
-        prev_times = deque(self._init_rhs())
-        mat_u = []
-        mat_u.append(prev_times[0])
-        print("Solving the matrix system for all times...")
-        for _ in np.arange(
-            self.interval[0] + self.dt * (len(self.equation[1]) - 2), self.interval[1] + self.dt, self.dt
-        ):
-            rhs = self._create_rhs(rhs_x, rhs_t, bc_x, prev_times)
-            if self.method_fd == "imp":
-                rhs, matrix = self._implement_bc(matrix, rhs, bc_x, first)
-            first = False
-            u = solve(matrix, rhs)
+        bc_rhs = np.zeros(self.Nx)
+        boundaries = None if bc_constants is None else self._batch_boundaries(bc_constants)
+        if _theta(self.method_fd) == 0:  # Diagonal matrix, no linear system to solve
+            linear_solver = DiagonalSolver(np.full(self.Nx, mat[1][mat[0] == 0][0]))
+        elif self.periodic:
+            linear_solver = CirculantSolver(mat[0].astype(int), mat[1], self.Nx)
+        else:  # Boundary terms are constant, compute them (and the matrix) only once
+            if solver == "lu":
+                matrix = diags(mat[1], mat[0].astype(int), shape=(self.Nx, self.Nx), format="lil")
+            else:  # Matrix-free, only the entries added by the boundary conditions are stored
+                matrix = dok_matrix((self.Nx, self.Nx))
+            bc_rhs, matrix = self._implement_bc(matrix, bc_rhs, bc_x, True)
+            if boundaries is not None:
+                bc_rhs = np.stack(
+                    [self._implement_bc(None, np.zeros(self.Nx), bc_x, False, elem)[0] for elem in boundaries], axis=-1
+                )
+            if solver == "lu":
+                linear_solver = BandedLU(matrix)
+            else:
+                operator = StencilOperator(mat[0].astype(int), mat[1], self.Nx, matrix)
+                linear_solver = KrylovSolver(operator, solver, **({} if solver_options is None else solver_options))
+        explicit_op = None
+        if rhs_x is not None:  # Explicit part, applied to the previous time step as one sparse product
+            explicit_op, explicit_const = self._explicit_operator(rhs_x, rhs_t, bc_x, boundaries)
+            bc_rhs = bc_rhs.reshape(self.Nx, -1) + explicit_const.reshape(self.Nx, -1)
+            bc_rhs = bc_rhs[:, 0] if boundaries is None else bc_rhs
+            rhs_t = rhs_t.copy()
+            rhs_t[1][rhs_t[0] == 0] = 0  # Now part of explicit_op
+        return linear_solver, rhs_t, explicit_op, bc_rhs
+
+    def iter_steps(
+        self,
+        acc_x=2,
+        acc_t=1,
+        verbose=False,
+        steady_tol=None,
+        steady_window=1,
+        initial=None,
+        bc_constants=None,
+        solver="lu",
+        solver_options=None,
+    ):
+        """Yield the time and the solution (t, u) at every time step, starting from the initial condition.
+
+        The solution history is not kept, only the previous time steps needed by
+        the scheme. Stopping the iteration stops the computation. If steady_tol is
+        given, the iteration also stops once max|u_{n+1} - u_n| < steady_tol for
+        steady_window consecutive time steps (steady state reached).
+
+        A batch of problems differing only by their initial conditions and/or the
+        constant terms of their boundary conditions can be solved at once: initial
+        is then a list with the initial conditions of every member (given as in
+        Fd_problem) and bc_constants an array of shape (batch, len(boundary)). All
+        members are marched together against the same factorized matrix, u is then
+        of shape (Nx, batch).
+
+        The system is solved with a banded LU factorization by default. For very wide
+        stencils, solver="gmres" or "bicgstab" only applies the matrix and solves
+        iteratively (see solvers.KrylovSolver, configured by solver_options), starting
+        from the previous time step. The number of iterations of every step is then
+        stored in self.iterations.
+        Explicit schemes (method_fd="exp") have a diagonal matrix, no system is solved
+        (the solver is not used) and every step is one sparse product and a division.
+        A ValueError is raised if the solution stops being finite (checked every
+        _FINITE_CHECK_EVERY steps and at the last one), e.g. for an unstable time step.
+
+        Examples
+        --------
+        >>> for t, u in problem.iter_steps():
+        ...     if np.max(u) < 1e-3:
+        ...         break
+        """
+        linear_solver, rhs_t, explicit_op, bc_rhs = self._assemble(
+            acc_x, acc_t, verbose, bc_constants, solver, solver_options
+        )
+        self.iterations = getattr(linear_solver, "iterations", None)
+        init = self._init_rhs(initial)
+        if len(init) != len(rhs_t[0]):
+            raise ValueError("Wrong number of initial conditions. Run self.bc_info for more details.")
+        if initial is not None or bc_constants is not None:  # Members of the batch are the columns of the rhs
+            batch = len(initial) if initial is not None else len(bc_constants)
+            if bc_constants is not None and len(bc_constants) != batch:
+                raise ValueError(f"Got {batch} initial conditions but {len(bc_constants)} boundary constants.")
+            init = np.broadcast_to(init.reshape(len(init), self.Nx, -1), (len(init), self.Nx, batch)).copy()
+            bc_rhs = bc_rhs.reshape(self.Nx, -1)
+        prev_times = deque(init)
+        times = self._time_steps()
+        yield times[0], prev_times[0]
+        converged = 0
+        for step, t in enumerate(times[1:], 1):
+            rhs = self._create_rhs(rhs_t, explicit_op, prev_times) + bc_rhs
+            u = linear_solver.solve(rhs, x0=prev_times[-1])
+            if (step % _FINITE_CHECK_EVERY == 0 or step == len(times) - 1) and not np.all(np.isfinite(u)):
+                raise ValueError(
+                    f"The solution is not finite at t={t}, the scheme is unstable. "
+                    f"Reduce the time step (dt={self.dt}) or use an implicit scheme."
+                )
+            if steady_tol is not None:
+                converged = converged + 1 if np.max(np.abs(u - prev_times[-1])) < steady_tol else 0
             prev_times.append(u)
             prev_times.popleft()
-            mat_u.append(u)
+            yield t, u
+            if steady_tol is not None and converged >= steady_window:
+                return
+
+    def march(self, callback, acc_x=2, acc_t=1, verbose=False):
+        """Call callback(t, u) at every time step, stop when it returns True.
+
+        Returns
+        -------
+        (t, u) : tuple
+            The last time reached and the solution at that time.
+        """
+        for t, u in self.iter_steps(acc_x, acc_t, verbose):
+            if callback(t, u):
+                break
+        return t, u
+
+    def forward_in_time(
+        self,
+        verbose=False,
+        sanity=False,
+        acc_x=2,
+        acc_t=1,
+        memmap=None,
+        save_every=1,
+        output_times=None,
+        steady_tol=None,
+        steady_window=1,
+        initial=None,
+        bc_constants=None,
+        solver="lu",
+        solver_options=None,
+    ):
+        """Step in time to find solution at all times.
+
+        Parameters
+        ----------
+        verbose : bool
+            Print the finite difference approximation used.
+        sanity : bool
+            Only return the information needed by self.info().
+        acc_x, acc_t : int
+            Accuracy of the approximations in space and time.
+        memmap : str or pathlib.Path
+            If given, the solution is stored in a numpy.memmap backed by this
+            (.npy) file instead of memory. Useful for runs larger than RAM. If rows were
+            reserved for an early stop (steady_tol), the file is truncated in place.
+        save_every : int
+            Only keep one every save_every time steps (the initial one is always kept).
+        output_times : list
+            Only keep the time steps closest to these times. Can not be combined with save_every.
+        steady_tol : float
+            If given, stop marching once max|u_{n+1} - u_n| < steady_tol for steady_window
+            consecutive time steps. The last time step is then always kept and the time
+            reached is stored in self.stop_time.
+        steady_window : int
+            Number of consecutive time steps the tolerance has to be satisfied.
+        initial : list
+            Initial conditions of every member of a batch (see iter_steps).
+        bc_constants : array_like of shape (batch, len(boundary))
+            Constant terms of the boundary conditions of every member of a batch.
+        solver : str
+            "lu" (banded LU factorization), "gmres" or "bicgstab" (iterative, see iter_steps).
+        solver_options : dict
+            Keyword arguments of solvers.KrylovSolver (rtol, maxiter, precond_bandwidth).
+
+        Returns
+        -------
+        mat_u : np.ndarray of shape (Nt, Nx) or (Nt, Nx, batch)
+            Solution at the time steps kept (rows) and inner points (columns). The
+            corresponding times are stored in self.times.
+
+        See Also
+        --------
+        iter_steps : Same time stepping without keeping the solution.
+        """
+        if sanity:
+            _, _, rhs_t, bc_x, expr_x, expr_t = self._discretize(acc_x, acc_t, verbose)
+            return bc_x, rhs_t, expr_x, expr_t
+        steps = self.iter_steps(
+            acc_x, acc_t, verbose, steady_tol, steady_window, initial, bc_constants, solver, solver_options
+        )
+        first = next(steps)  # Assemble the system (and check the input) before allocating the solution
+        times = self._time_steps()
+        saved = np.zeros(len(times), dtype=bool)
+        saved[self._saved_steps(times, save_every, output_times)] = True
+        # Room for the last step if stopped early, first[1] is of shape (Nx,) or (Nx, batch)
+        shape = (int(sum(saved)) + (steady_tol is not None),) + first[1].shape
+        mat_u = np.empty(shape) if memmap is None else open_memmap(memmap, mode="w+", dtype=float, shape=shape)
+        saved_times = []
+        print("Solving the matrix system for all times...")
+        for count, (t, u) in enumerate(chain([first], steps)):
+            if saved[count]:
+                mat_u[len(saved_times)] = u
+                saved_times.append(t)
+        if count < len(times) - 1:
+            print(f"Steady state reached at t={t}.")
+            if not saved[count]:
+                mat_u[len(saved_times)] = u
+                saved_times.append(t)
+        if memmap is not None and len(saved_times) < len(mat_u):  # Rows reserved for an early stop, left unused
+            mat_u.flush()
+            del mat_u
+            _truncate_npy(memmap, len(saved_times))
+            mat_u = open_memmap(memmap, mode="r+")
+        mat_u = mat_u[: len(saved_times)]
+        if memmap is not None:
+            mat_u.flush()
         self.solution = mat_u
+        self.times = np.array(saved_times)
+        self.stop_time = t
         print("Done.")
         return mat_u
 
+    def _propagator(self, acc_x=2, acc_t=1, verbose=False):
+        """Return the matrix of one time step acting on the state [u_{n-k+1}, ..., u_n, 1].
+
+        The scheme is linear and time-invariant, the step is applied once to the columns
+        of the identity (as a batch), the last column (zero state) gives the constant terms.
+        """
+        linear_solver, rhs_t, explicit_op, bc_rhs = self._assemble(acc_x, acc_t, verbose)
+        levels = len(rhs_t[0])
+        size = levels * self.Nx
+        basis = np.eye(size, size + 1).reshape(levels, self.Nx, size + 1)
+        new = linear_solver.solve(self._create_rhs(rhs_t, explicit_op, basis) + bc_rhs[:, None])
+        prop = np.zeros((size + 1, size + 1))
+        prop[: size - self.Nx, self.Nx : size] = np.eye(size - self.Nx)  # Previous levels are shifted
+        prop[size - self.Nx : size, :size] = new[:, :size] - new[:, size:]
+        prop[size - self.Nx : size, size] = new[:, size]
+        prop[size, size] = 1
+        return prop
+
+    def solve_at(self, t, acc_x=2, acc_t=1, verbose=False):
+        """Return the solution at time t without marching through all the time steps.
+
+        The step propagator (built from the same matrix as forward_in_time) is raised to
+        the number of steps needed by repeated squaring, which costs O(log(n)) dense
+        matrix products of size (order in time * Nx)^2 instead of n solves. Useful for
+        times far in the future (t can be after the end of the interval) at moderate Nx.
+        The time step closest to t is used.
+
+        Returns
+        -------
+        u : np.ndarray of shape (Nx,)
+            Solution at the inner points.
+        """
+        level = int(np.round((t - self.interval[0]) / self.dt))
+        if level < 0:
+            raise ValueError(f"Can not solve before the initial time {self.interval[0]}, got t={t}.")
+        prop = self._propagator(acc_x, acc_t, verbose)
+        init = self._init_rhs()
+        if len(init) * self.Nx + 1 != len(prop):
+            raise ValueError("Wrong number of initial conditions. Run self.bc_info for more details.")
+        if level < len(init):
+            return init[level]
+        state = np.linalg.matrix_power(prop, level - len(init) + 1) @ np.append(init.ravel(), 1.0)
+        return state[-1 - self.Nx : -1]
+
+    def solve_steady(self, acc_x=2, verbose=False):
+        """Solve the steady state problem (all time derivatives set to zero) with a single banded solve.
+
+        Equations without time derivatives, e.g. ((5, 0, 0, 0, 0, 1), (2, 3)), are solved directly.
+        Contrary to forward_in_time, the constants of the equation are taken into account.
+
+        Returns
+        -------
+        u : np.ndarray of shape (Nx,)
+            Solution at the inner points.
+        """
+        if self.boundary is None and not self.periodic:
+            raise ValueError("Boundary conditions are needed to solve the problem. Use self.add() to provide them.")
+        u_coef = self.equation[1][1] if len(self.equation[1]) > 1 else 0
+        expr_x, mat_x, _ = utils._x_or_t_to_epxrlist(
+            self.equation[0], self.method[0], "dx", self.dx, acc=acc_x, order_t=0
+        )
+        if verbose:
+            print("*******************Approximation*****************")
+            print(f"Left hand side: {expr_x}")
+            print("Where U(i, j) means at point x = i*delta x")
+        mat, _, _, bc_x = utils._exprlist_to_mat([mat_x, ExpressionList({0: u_coef})], "imp")
+        rhs = np.ones(self.Nx) * (self.equation[0][0] - self.equation[1][0])
+        if self.periodic:
+            return CirculantSolver(mat[0].astype(int), mat[1], self.Nx).solve(rhs)
+        if len(self.boundary) != len(bc_x[0]):
+            raise ValueError("Wrong number of boundary conditions. Run self.bc_info for more details.")
+        matrix = diags(mat[1], mat[0].astype(int), shape=(self.Nx, self.Nx), format="lil")
+        rhs, matrix = self._implement_bc(matrix, rhs, bc_x, True)
+        return BandedLU(matrix).solve(rhs)
+
     def post_process(
         self,
         mat_u,
@@ -369,8 +878,15 @@ class Fd_problem:
         error=False,
         anim=True,
         jup=False,
+        times=None,
     ):
-        """Plot the solution for all times in a GIF."""
+        """Plot the solution for all times in a GIF.
+
+        The times of the rows of mat_u can be given in times, by default these are
+        the ones of the last solution computed (see save_every/output_times in forward_in_time).
+        """
+        if times is None and mat_u is self.solution:
+            times = self.times
         return start_animation(
             domain=self.domain,
             time_interval=self.interval,
@@ -393,4 +909,5 @@ class Fd_problem:
             error=error,
             anim=anim,
             jup=jup,
+            times=times,
         )
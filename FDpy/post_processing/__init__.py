@@ -1 +1 @@
-from .post_processing import start_animation
+from .post_processing import start_animation, add_boundary
@@ -1,32 +1,83 @@
-"""Module to animate the solution in a GIF."""
+"""Module to animate the solution in a GIF.
+
+Matplotlib (and IPython in notebooks) are only imported when an animation is
+created, so that importing FDpy to solve problems stays fast.
+"""
 
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
 from functools import partial
 import numpy as np
 import pathlib
-from IPython.display import display, clear_output
 
 
 ROOT_DIRECTORY = pathlib.Path(__file__).resolve().parent.parent.parent / "sample_code"
-mpl.rcParams["animation.ffmpeg_path"] = ROOT_DIRECTORY
 
 
-def transfrom_to_mat(exact, domain, dx, interval, dt):
-    """Transform the given exact solution into a matrix."""
+def _import_matplotlib():
+    """Import and configure matplotlib, return pyplot and animation."""
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+
+    mpl.rcParams["animation.ffmpeg_path"] = ROOT_DIRECTORY
+    return plt, animation
+
+
+def _import_ipython():
+    """Import the IPython functions used to animate inside notebooks."""
+    try:
+        from IPython.display import display, clear_output
+    except ImportError:
+        raise ImportError("IPython is needed to animate in a notebook (jup=True), install it or use jup=False.")
+    return display, clear_output
+
+
+def transfrom_to_mat(exact, domain, dx, interval, dt, times=None):
+    """Transform the given exact solution into a matrix.
+
+    If times is given, only the columns at these times are returned.
+    """
     x_vec = np.arange(domain[0], domain[1] + dx, dx)
     t_vec = np.arange(interval[0], interval[1] + dt, dt)
     if callable(exact):
         exact = np.vectorize(exact)
-        return exact(x_vec[:, None], t_vec[None, :])
+        return exact(x_vec[:, None], (t_vec if times is None else np.asarray(times))[None, :])
     else:
         try:
-            return np.reshape(np.array(exact), (len(x_vec), len(t_vec)))
+            exact_mat = np.reshape(np.array(exact), (len(x_vec), len(t_vec)))
         except ValueError:
             raise ValueError(
                 f"Wrong shape of exact solution. Specify either a function or an array of size {len(x_vec)*len(t_vec)}."
             )
+        if times is not None:
+            exact_mat = exact_mat[:, np.rint((np.asarray(times) - interval[0]) / dt).astype(int)]
+        return exact_mat
+
+
+def add_boundary(u_mat, boundary, bc_map):
+    """Add the boundary points to the solution at inner points.
+
+    Works on a single time step (shape (Nx,)) or on all of them at once (shape (Nt, Nx)).
+    On periodic domains (boundary is None), the first point is repeated at the end.
+    """
+    u_mat = np.asarray(u_mat)
+    if boundary is None:
+        return np.concatenate((u_mat, u_mat[..., :1]), axis=-1)
+    bc_map = np.array(bc_map)
+    p = sum(bc_map >= 0)
+    n = sum(bc_map < 0)
+    left_entries = np.zeros(u_mat.shape[:-1] + (p,))
+    right_entries = np.zeros(u_mat.shape[:-1] + (n,))
+    for count, elem in enumerate(boundary):
+        dummy = elem[0]
+        if bc_map[count] < 0:
+            for counter, idx in enumerate(elem[1:]):
+                dummy = dummy + idx * u_mat[..., -(counter + 1)]
+            right_entries[..., bc_map[count]] = dummy
+        else:
+            for counter, idx in enumerate(elem[1:]):
+                dummy = dummy + idx * u_mat[..., counter]
+            left_entries[..., bc_map[count]] = dummy
+    return np.concatenate((left_entries, u_mat, right_entries), axis=-1)
 
 
 def start_animation(
@@ -51,8 +102,13 @@ def start_animation(
     error,
     anim,
     jup,
+    times=None,
 ):
-    """Run the animation using function "animate" and allow suer to specify some parameters."""
+    """Run the animation using function "animate" and allow suer to specify some parameters.
+
+    If the solution was decimated (only some time steps kept), the times of the rows of
+    u_mat should be given in times to have the right labels/exact solution.
+    """
 
     def animate(
         i,
@@ -66,31 +122,11 @@ def start_animation(
         line3=None,
         line4=None,
         bc_map=None,
-        u_with_bc=[],
-        bc=False,
     ):
         x0 = domain[0]
         xf = domain[1]
         x_vec = np.arange(x0, xf + dx, dx)
-        u_vec = u_mat[int(i)]
-        bc_map = np.array(bc_map)
-        p = sum(bc_map >= 0)
-        n = sum(bc_map < 0)
-        left_entries = np.zeros(p)
-        right_entries = np.zeros(n)
-        for count, elem in enumerate(boundary):
-            dummy = elem[0]
-            if bc_map[count] < 0:
-                for counter, idx in enumerate(elem[1:]):
-                    dummy += idx * u_vec[-(counter + 1)]
-                right_entries[bc_map[count]] = dummy
-            else:
-                for counter, idx in enumerate(elem[1:]):
-                    dummy += idx * u_vec[counter]
-                left_entries[bc_map[count]] = dummy
-        u_vec = np.insert(u_vec, 0, left_entries)
-        u_vec = np.insert(u_vec, len(u_vec), right_entries)
-        u_with_bc.append(u_vec)
+        u_vec = add_boundary(u_mat[int(i)], boundary, bc_map)
         if line2 is not None:
             line2.set_xdata(x_vec)
             line2.set_ydata(u_vec)
@@ -99,26 +135,29 @@ def start_animation(
             line3.set_xdata(x_vec)
             line3.set_ydata(exact_vec)
         if line4 is not None:
-            line4.set_text(f"t={np.around((i+1)*dt, decimals=1)}s")
+            t = (i + 1) * dt if times is None else times[i]
+            line4.set_text(f"t={np.around(t, decimals=1)}s")
         if jup:
             clear_output(wait=True)
             display(fig)
             clear_output(wait=True)
-        if bc:
-            return u_with_bc
         return (x_vec, u_vec)
 
+    u_mat = np.asarray(u_mat)
     if anim:
+        plt, animation = _import_matplotlib()
+        if jup:
+            display, clear_output = _import_ipython()
         fig, ax = plt.subplots()
         if exact is not None:
-            exact_mat = transfrom_to_mat(exact, domain, dx, time_interval, dt)
+            exact_mat = transfrom_to_mat(exact, domain, dx, time_interval, dt, times)
             u_min = min(np.min(u_mat), np.min(exact_mat))
             u_max = max(np.max(u_mat), np.max(exact_mat))
             line3 = ax.plot(0.0, 0.0, label=exact_label)[0]
         else:
             exact_mat = None
-            u_min = np.min(np.array(u_mat))
-            u_max = np.max(np.array(u_mat))
+            u_min = np.min(u_mat)
+            u_max = np.max(u_mat)
             line3 = None
         line2 = ax.plot(0.0, 0.0, label=label)[0]
         line4 = ax.text(
@@ -165,21 +204,9 @@ def start_animation(
 
     if exact is not None and error:
         if not anim:
-            exact_mat = transfrom_to_mat(exact, domain, dx, time_interval, dt)
-        u_with_bc = []
-        for count, _ in enumerate(np.arange(time_interval[0], time_interval[1] + dt, dt)):
-            u_with_bc = animate(
-                count,
-                domain=domain,
-                dx=dx,
-                dt=dt,
-                boundary=boundary,
-                u_mat=u_mat,
-                exact_mat=exact_mat,
-                bc_map=bc_map,
-                u_with_bc=u_with_bc,
-                bc=True,
-            )
+            exact_mat = transfrom_to_mat(exact, domain, dx, time_interval, dt, times)
+        n_times = len(np.arange(time_interval[0], time_interval[1] + dt, dt)) if times is None else len(times)
+        u_with_bc = add_boundary(u_mat[:n_times], boundary, bc_map)
         return np.linalg.norm(u_with_bc - np.transpose(exact_mat))
     else:
         return None
@@ -0,0 +1 @@
+from .solvers import BandedLU, KrylovSolver, StencilOperator, CirculantSolver, DiagonalSolver
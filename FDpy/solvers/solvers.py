@@ -0,0 +1,276 @@
+"""Define the linear solvers used to march a finite difference problem in time."""
+
+
+import numpy as np
+from scipy.fft import rfft, irfft
+from scipy.sparse import coo_matrix, csr_matrix, diags
+from scipy.sparse.linalg import LinearOperator, gmres, bicgstab
+from scipy.linalg.lapack import dgbtrf, dgbtrs
+
+
+class BandedLU:
+    """
+    A class to solve a banded linear system many times with a single factorization.
+
+    The matrix is stored in the LAPACK band format, factorized once (LU with partial
+    pivoting) when the instance is created, and every call to solve only performs the
+    forward/back substitution, which costs O(Nx*bandwidth) instead of O(Nx^3).
+
+    Parameters
+    ----------
+    matrix: scipy.sparse matrix or np.ndarray
+        Square matrix to be factorized. The lower/upper bandwidths are deduced
+        from the position of its non-zero entries.
+
+    Methods
+    -------
+    solve(self, rhs, x0=None):
+        Solve the system for a rhs of shape (Nx,) or (Nx, k).
+    """
+
+    def __init__(self, matrix):
+        matrix = coo_matrix(matrix)
+        matrix.sum_duplicates()
+        n_rows, n_cols = matrix.shape
+        if n_rows != n_cols:
+            raise ValueError(f"Matrix must be square, got a shape of {matrix.shape}.")
+        offsets = matrix.col - matrix.row
+        self.n = n_rows
+        self.kl = int(max(0, -offsets.min(initial=0)))
+        self.ku = int(max(0, offsets.max(initial=0)))
+        ab = np.zeros((2 * self.kl + self.ku + 1, self.n))
+        ab[self.kl + self.ku + matrix.row - matrix.col, matrix.col] = matrix.data
+        self.lu, self.piv, info = dgbtrf(ab, self.kl, self.ku, overwrite_ab=True)
+        if info > 0:
+            raise np.linalg.LinAlgError("Matrix is singular, check the boundary conditions provided.")
+
+    def solve(self, rhs, x0=None):
+        """Solve the factorized system for one or many right hand sides (x0 is not needed by a direct solver)."""
+        rhs = np.asarray(rhs, dtype=float)
+        x, info = dgbtrs(self.lu, self.kl, self.ku, rhs.reshape(self.n, -1), self.piv)
+        if info < 0:
+            raise ValueError(f"Wrong argument given to the banded solver (LAPACK info = {info}).")
+        return x.reshape(rhs.shape)
+
+
+class StencilOperator(LinearOperator):
+    """
+    A matrix-free operator applying a banded stencil plus a few boundary corrections.
+
+    The matrix is never assembled: the diagonals (offsets, values) are applied with
+    strided slices in O(n*len(offsets)) operations and O(len(offsets)) storage. The
+    entries added by the boundary conditions (a few rows at both ends) are kept in
+    a sparse correction matrix.
+
+    Parameters
+    ----------
+    offsets: array_like
+        Positions of the diagonals wrt the main one (0 for diagonal, 1 for the one above, ...).
+    values: array_like
+        Constant value on each of these diagonals.
+    n: int
+        Size of the matrix.
+    correction: scipy.sparse matrix
+        Entries added to the stencil (e.g. by the boundary conditions), None if there are none.
+
+    Methods
+    -------
+    band(self, bandwidth):
+        Return the entries with |col - row| <= bandwidth as a sparse matrix.
+    """
+
+    def __init__(self, offsets, values, n, correction=None):
+        super().__init__(dtype=float, shape=(n, n))
+        offsets = np.asarray(offsets, dtype=int)
+        keep = np.abs(offsets) < n
+        self.offsets = offsets[keep]
+        self.values = np.asarray(values, dtype=float)[keep]
+        self.correction = None if correction is None else csr_matrix(correction, dtype=float)
+
+    def _matvec(self, x):
+        """Apply the stencil to x, then the boundary corrections."""
+        x = np.ravel(x)
+        n = self.shape[0]
+        y = np.zeros(n)
+        for off, val in zip(self.offsets, self.values):
+            if off >= 0:
+                y[: n - off] += val * x[off:]
+            else:
+                y[-off:] += val * x[: n + off]
+        if self.correction is not None:
+            y += self.correction @ x
+        return y
+
+    def band(self, bandwidth):
+        """Return the entries with |col - row| <= bandwidth as a sparse matrix (e.g. for a preconditioner)."""
+        keep = np.abs(self.offsets) <= bandwidth
+        band = coo_matrix(self.shape)
+        if np.any(keep):
+            band = coo_matrix(diags(self.values[keep], self.offsets[keep], shape=self.shape))
+        if self.correction is not None:
+            corr = coo_matrix(self.correction)
+            inside = np.abs(corr.col - corr.row) <= bandwidth
+            band = band + coo_matrix((corr.data[inside], (corr.row[inside], corr.col[inside])), shape=self.shape)
+        return band
+
+
+class KrylovSolver:
+    """
+    A class to solve a sparse linear system many times with an iterative (Krylov) method.
+
+    The matrix is never factorized, it is only applied to vectors (as a
+    scipy.sparse.linalg.LinearOperator), which avoids the cost/storage of a
+    factorization for very wide stencils. Given a StencilOperator, the matrix is
+    not even assembled. The band |col - row| <= precond_bandwidth of the matrix is
+    factorized once (see BandedLU) and reused as preconditioner for every solve.
+
+    Parameters
+    ----------
+    matrix: StencilOperator, scipy.sparse matrix or np.ndarray
+        Square matrix of the system.
+    method: str
+        "gmres" or "bicgstab".
+    rtol: float
+        Relative tolerance on the residual.
+    maxiter: int
+        Maximum number of iterations for one solve (default of scipy if None).
+    precond_bandwidth: int
+        Half bandwidth of the preconditioner (0 for Jacobi, None for no preconditioner).
+
+    Attributes
+    ----------
+    iterations: list
+        Number of iterations of every call to solve (summed over the columns of the rhs).
+        A column counts 0 iterations only if its initial guess already satisfies rtol,
+        bicgstab converging at the half step of its first iteration counts 1.
+
+    Methods
+    -------
+    solve(self, rhs, x0=None):
+        Solve the system for a rhs of shape (Nx,) or (Nx, k), starting from x0 if given.
+    """
+
+    def __init__(self, matrix, method="gmres", rtol=1e-10, maxiter=None, precond_bandwidth=1):
+        if method not in _KRYLOV_METHODS:
+            raise ValueError(f"Only {', '.join(_KRYLOV_METHODS)} are implemented as iterative methods, not {method}.")
+        if not isinstance(matrix, StencilOperator):
+            matrix = csr_matrix(matrix, dtype=float)
+            if matrix.shape[0] != matrix.shape[1]:
+                raise ValueError(f"Matrix must be square, got a shape of {matrix.shape}.")
+        self.n = matrix.shape[0]
+        self.method = method
+        self.rtol = rtol
+        self.maxiter = maxiter
+        if isinstance(matrix, StencilOperator):
+            self.operator = matrix
+        else:
+            self.operator = LinearOperator(matrix.shape, matvec=matrix.dot, dtype=float)
+        self.preconditioner = None
+        if precond_bandwidth is not None:
+            if isinstance(matrix, StencilOperator):
+                band = matrix.band(precond_bandwidth)
+            else:
+                band = coo_matrix(matrix)
+                keep = np.abs(band.col - band.row) <= precond_bandwidth
+                band = coo_matrix((band.data[keep], (band.row[keep], band.col[keep])), shape=matrix.shape)
+            self.preconditioner = LinearOperator(matrix.shape, matvec=BandedLU(band).solve, dtype=float)
+        self.iterations = []
+
+    def solve(self, rhs, x0=None):
+        """Solve the system for one or many right hand sides, starting from x0 (e.g. the previous time step)."""
+        rhs = np.asarray(rhs, dtype=float)
+        columns = rhs.reshape(self.n, -1)
+        guesses = None if x0 is None else np.broadcast_to(np.reshape(x0, (self.n, -1)), columns.shape)
+        x = np.empty_like(columns)
+        count = 0
+        for col in range(columns.shape[1]):
+            counter = []
+            start = np.zeros(self.n) if guesses is None else guesses[:, col]
+            kwargs = {"callback_type": "pr_norm"} if self.method == "gmres" else {}
+            x[:, col], info = _KRYLOV_METHODS[self.method](
+                self.operator,
+                columns[:, col],
+                x0=start,
+                rtol=self.rtol,
+                atol=0.0,
+                maxiter=self.maxiter,
+                M=self.preconditioner,
+                callback=counter.append,
+                **kwargs,
+            )
+            if info > 0:
+                raise np.linalg.LinAlgError(f"{self.method} did not converge in {info} iterations.")
+            if info < 0:
+                raise np.linalg.LinAlgError(f"{self.method} broke down or got an illegal input (info={info}).")
+            # bicgstab can converge at the half step, before calling callback
+            count += len(counter) if counter or np.array_equal(x[:, col], start) else 1
+        self.iterations.append(count)
+        return x.reshape(rhs.shape)
+
+
+class CirculantSolver:
+    """
+    A class to solve a circulant linear system (periodic domain) by FFT diagonalization.
+
+    The matrix has the entry values[k] on the diagonal offsets[k], wrapped around
+    (A[i, (i + offsets[k]) % n] = values[k]). Such matrices are diagonalized by the
+    discrete Fourier transform, every solve costs O(n*log(n)).
+
+    Parameters
+    ----------
+    offsets: array_like
+        Positions of the diagonals wrt the main one (0 for diagonal, 1 for the one above, ...).
+    values: array_like
+        Values on these diagonals.
+    n: int
+        Size of the matrix.
+
+    Methods
+    -------
+    solve(self, rhs, x0=None):
+        Solve the system for a rhs of shape (n,) or (n, k).
+    """
+
+    def __init__(self, offsets, values, n):
+        self.n = n
+        column = np.zeros(n)
+        np.add.at(column, (-np.asarray(offsets, dtype=int)) % n, np.asarray(values, dtype=float))
+        self.eigenvalues = rfft(column)
+        if np.any(np.abs(self.eigenvalues) <= 1e-12 * np.max(np.abs(self.eigenvalues))):
+            raise np.linalg.LinAlgError("Circulant matrix is singular, the periodic problem has no unique solution.")
+
+    def solve(self, rhs, x0=None):
+        """Solve the system for one or many right hand sides (x0 is not needed by a direct solver)."""
+        rhs = np.asarray(rhs, dtype=float)
+        eigenvalues = self.eigenvalues.reshape((-1,) + (1,) * (rhs.ndim - 1))
+        return irfft(rfft(rhs, axis=0) / eigenvalues, n=self.n, axis=0)
+
+
+class DiagonalSolver:
+    """
+    A class to "solve" a diagonal linear system (explicit schemes) by a division.
+
+    Parameters
+    ----------
+    diagonal: array_like
+        Entries on the diagonal, of shape (n,).
+
+    Methods
+    -------
+    solve(self, rhs, x0=None):
+        Solve the system for a rhs of shape (n,) or (n, k).
+    """
+
+    def __init__(self, diagonal):
+        diagonal = np.asarray(diagonal, dtype=float)
+        if np.any(diagonal == 0):
+            raise np.linalg.LinAlgError("Diagonal matrix is singular.")
+        self.inverse = 1 / diagonal
+
+    def solve(self, rhs, x0=None):
+        """Solve the system for one or many right hand sides (x0 is not needed by a direct solver)."""
+        rhs = np.asarray(rhs, dtype=float)
+        return rhs * self.inverse.reshape((-1,) + (1,) * (rhs.ndim - 1))
+
+
+_KRYLOV_METHODS = {"gmres": gmres, "bicgstab": bicgstab}
@@ -0,0 +1 @@
+from .sweep import sweep, config_grid
@@ -0,0 +1,97 @@
+"""Solve many finite difference problems in parallel (parameter sweeps)."""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import itertools
+from ..fd_problem import Fd_problem, Fd_spec
+from ..utils import utils
+
+
+_SOLVE_ARGS = (
+    "acc_x",
+    "acc_t",
+    "save_every",
+    "output_times",
+    "steady_tol",
+    "steady_window",
+    "solver",
+    "solver_options",
+)
+
+
+def config_grid(base, **variations):
+    """Return the configurations obtained with all combinations of the variations given.
+
+    Examples
+    --------
+    >>> base = {"domain": (0, 1), "interval": (0, 1), "equation": ((0, 0, 0, 1), (0, 0, 1)),
+    ...         "boundary": (0, 0), "initial": 1, "bc_map": [0, -1]}
+    >>> configs = config_grid(base, dx=[0.1, 0.05], dt=[0.1, 0.01])
+    >>> len(configs)
+    4
+    """
+    names = list(variations)
+    return [dict(base, **dict(zip(names, values))) for values in itertools.product(*variations.values())]
+
+
+def _split_config(config):
+    """Separate the arguments of Fd_problem from the ones of forward_in_time."""
+    if isinstance(config, Fd_spec):
+        return config.kwargs(), {}
+    problem_args = {k: v for k, v in config.items() if k not in _SOLVE_ARGS}
+    solve_args = {k: v for k, v in config.items() if k in _SOLVE_ARGS}
+    return problem_args, solve_args
+
+
+def _init_worker(stencils):
+    """Give the workers the stencils already derived by the main process."""
+    utils.seed_stencil_cache(stencils)
+
+
+def _solve(index, config, reduce):
+    """Solve one configuration, return its index, the times kept and the solution (or its reduction)."""
+    problem_args, solve_args = _split_config(config)
+    problem = Fd_problem(**problem_args)
+    mat_u = problem.forward_in_time(**solve_args)
+    return index, problem.times, mat_u if reduce is None else reduce(problem, mat_u)
+
+
+def sweep(configs, reduce=None, max_workers=None, mp_context=None):
+    """Solve every configuration in a process pool, yield the results as they complete.
+
+    The stencils of all configurations are derived once in the main process (identical
+    ones only once) and sent to the workers, which therefore do not derive them again.
+
+    Parameters
+    ----------
+    configs: list of dict or Fd_spec
+        Keyword arguments of Fd_problem, optionally with the ones of forward_in_time
+        (acc_x, acc_t, save_every, output_times, steady_tol, steady_window). See config_grid.
+        Specifications (Fd_spec) are solved with the default arguments of forward_in_time.
+    reduce: callable
+        If given, reduce(problem, mat_u) is sent back instead of the solution to keep
+        results small (e.g. the solution at the last time, an error norm). It has to
+        be picklable (defined at the top level of a module).
+    max_workers: int
+        Number of processes, see concurrent.futures.ProcessPoolExecutor.
+    mp_context: multiprocessing context
+        Context used to start the processes (e.g. multiprocessing.get_context("spawn")).
+
+    Yields
+    ------
+    (index, times, result) : tuple
+        Index of the configuration in configs, times kept (see Fd_problem.times) and
+        the solution (or its reduction). Results come in order of completion.
+    """
+    configs = list(configs)
+    for config in configs:  # Fails early on wrong configurations, and derives the stencils
+        problem_args, solve_args = _split_config(config)
+        Fd_problem(**problem_args)._discretize(solve_args.get("acc_x", 2), solve_args.get("acc_t", 1))
+    executor = ProcessPoolExecutor(
+        max_workers, mp_context=mp_context, initializer=_init_worker, initargs=(utils.export_stencil_cache(),)
+    )
+    try:
+        futures = [executor.submit(_solve, index, config, reduce) for index, config in enumerate(configs)]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(cancel_futures=True)
@@ -1,7 +1,9 @@
 """Test functions in Fdproblem class."""
 
 
-from FDpy.fd_problem import Fd_problem
+from FDpy.fd_problem import Fd_problem, Fd_spec
+from FDpy.fd_problem.fd_problem import _truncate_npy
+import pickle
 import pytest
 import numpy as np
 from FDpy.expressions import Symbol
@@ -42,6 +44,14 @@ def test_init_rhs(initial, equation, act_res):
     assert np.all(res == act_res), f"RHS is wrong, expected{act_res} but got {act_res}"
 
 
+def test_init_without_boundary():
+    """Test if initial conditions not depending on x can be given before the boundary conditions."""
+    P = Fd_problem((0, 1), (0, 1), ((0, 0, 0, 1), (0, 0, 0, 1)), None, ((2,), (0, 1)), dx=0.2, dt=0.2)
+    P.info()
+    P.add(boundary=(0, 0), bc_map=[0, -1])
+    assert np.all(P._init_rhs() == 2)
+
+
 @pytest.mark.parametrize(
     "bo, equation, bc_x, bc_map, size, exp_rhs",
     [
@@ -124,3 +134,312 @@ def test_implement_bc_mat(bo, equation, bc_x, bc_map, size, exp_mat, check_type)
     else:
         for elem in exp_mat:
             assert np.around(elem[2], decimals=1) == np.around(act_mat[elem[0], elem[1]], decimals=1)
+
+
+@pytest.mark.parametrize(
+    "bo, equation, bc_x, bc_map, exp_mat, exp_const",
+    [
+        (
+            [(1, 0.5, 0.2), (2, 0.3)],
+            ((0, 0, 0, 1), (0, 0, 1)),
+            np.array([[-1, 1], [25, 25]]),
+            [0, -1],
+            [[0.5, 0.2, 0, 0], [0, 0, 0, 0.3]],
+            [1, 2],
+        ),
+        (
+            [(1, 4), 3, 2, (5, 1, 1)],
+            ((0, 0, 0, 0, 1), (0, 0, 1)),
+            np.array([[-2, -1, 1, 2], [-125, 125, 125, -125]]),
+            [1, 0, -2, -1],
+            [[0, 0], [4, 0], [0, 0], [1, 1]],
+            [3, 1, 2, 5],
+        ),
+    ],
+)
+def test_ghost_operator(bo, equation, bc_x, bc_map, exp_mat, exp_const):
+    """Test if the boundary conditions are compiled into the right operator for explicit schemes."""
+    P = Fd_problem((0, 1), (0, 1), equation, bo, (1), dx=0.2, dt=0.2, method_fd="exp", bc_map=bc_map)
+    ghost_mat, ghost_const, n = P._ghost_operator(bc_x)
+    assert n == sum(bc_x[0] < 0)
+    assert np.all(ghost_mat.toarray() == exp_mat), f"expected {exp_mat} but got {ghost_mat.toarray()}"
+    assert np.all(ghost_const == exp_const), f"expected {exp_const} but got {ghost_const}"
+
+
+@pytest.mark.parametrize("periodic", [False, True])
+def test_explicit_operator(periodic):
+    """Test if the explicit part of the scheme is the stencil applied with the ghost points."""
+    boundary = None if periodic else (1, (2, 0.5))
+    bc_map = None if periodic else [0, -1]
+    P = Fd_problem(
+        (0, 1), (0, 1), ((0, 0, 0, 1), (0, 0, 1)), boundary, 0, dx=0.1, dt=0.001, method_fd="exp", bc_map=bc_map,
+        periodic=periodic,
+    )
+    _, rhs_x, rhs_t, bc_x, _, _ = P._discretize()
+    op, const = P._explicit_operator(rhs_x, rhs_t, bc_x)
+    u = np.random.default_rng(0).uniform(-1, 1, P.Nx)
+    ext = np.concatenate(([u[-1]], u, [u[0]]) if periodic else ([1], u, [2 + 0.5 * u[-1]]))
+    expected = 1000 * u + 100 * (ext[:-2] - 2 * ext[1:-1] + ext[2:])
+    assert np.allclose(op @ u + const, expected), f"expected {expected} but got {op @ u + const}"
+
+
+@pytest.mark.parametrize("interval, dx", [((0, 30), 0.1), ((0, 9.5), 0.01)])
+def test_explicit_unstable(interval, dx):
+    """Test if an unstable explicit scheme leads to an error (found periodically or at the last step)."""
+    P = Fd_problem(
+        (0, 1), interval, ((0, 0, 0, 1), (0, 0, 1)), (0, 0), 1, dx=dx, dt=0.1, method_fd="exp", bc_map=[0, -1]
+    )
+    with np.errstate(over="ignore", invalid="ignore"), pytest.raises(ValueError, match="unstable"):
+        P.forward_in_time()
+
+
+def test_forward_in_time_memmap(tmp_path):
+    """Test if the solution is preallocated and can be backed by a file."""
+    P = Fd_problem((0, 1), (0, 0.5), ((0, 0, 0, 1), (0, 0, 1)), (0, 0), (1), dx=0.1, dt=0.1, bc_map=[0, -1])
+    in_memory = P.forward_in_time()
+    on_disk = P.forward_in_time(memmap=tmp_path / "u.npy")
+    assert isinstance(in_memory, np.ndarray) and in_memory.shape == (6, P.Nx)
+    assert isinstance(on_disk, np.memmap) and P.solution is on_disk
+    assert np.allclose(np.load(tmp_path / "u.npy"), in_memory)
+
+
+@pytest.mark.parametrize(
+    "save_every, output_times, exp_rows",
+    [
+        (1, None, [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10]),
+        (3, None, [0, 3, 6, 9]),
+        (1, [0.5, 0.22, 1, 0.21], [2, 5, 10]),
+    ],
+)
+def test_forward_in_time_decimation(save_every, output_times, exp_rows):
+    """Test if only the requested time steps are kept, with the right times."""
+    P = Fd_problem((0, 1), (0, 1), ((0, 0, 0, 1), (0, 0, 1)), (0, 0), (1), dx=0.1, dt=0.1, bc_map=[0, -1])
+    full = P.forward_in_time()
+    res = P.forward_in_time(save_every=save_every, output_times=output_times)
+    assert np.allclose(res, full[exp_rows])
+    assert np.allclose(P.times, np.array(exp_rows) * 0.1), f"expected times {exp_rows} but got {P.times}"
+
+
+def test_forward_in_time_decimation_error():
+    """Test if wrong decimation arguments lead to errors."""
+    P = Fd_problem((0, 1), (0, 1), ((0, 0, 0, 1), (0, 0, 1)), (0, 0), (1), dx=0.1, dt=0.1, bc_map=[0, -1])
+    with pytest.raises(ValueError):
+        P.forward_in_time(save_every=0)
+    with pytest.raises(ValueError):
+        P.forward_in_time(save_every=2, output_times=[0.5])
+    with pytest.raises(ValueError):
+        P.forward_in_time(output_times=[2])
+
+
+def test_iter_steps():
+    """Test if the generator/callback give the same steps as forward_in_time and can stop early."""
+    P = Fd_problem((0, 1), (0, 1), ((0, 0, 0, 1), (0, 0, 1)), (0, 0), (1), dx=0.1, dt=0.1, bc_map=[0, -1])
+    full = P.forward_in_time()
+    steps = list(P.iter_steps())
+    assert np.allclose([t for t, _ in steps], P.times)
+    assert np.allclose([u for _, u in steps], full)
+    t, u = P.march(lambda t, u: np.max(u) < 0.5)
+    idx = np.argmax(np.max(full, axis=1) < 0.5)
+    assert np.isclose(t, P.times[idx]) and np.allclose(u, full[idx])
+
+
+@pytest.mark.parametrize(
+    "method_fd, equation, boundary, bc_map, dt",
+    [
+        ("imp", ((0, 0, 0, 1), (0, 0, 1)), ((0, 0.5), 1), [0, -1], 0.1),
+        ("exp", ((0, 0, 0, 1), (0, 0, 1)), (0, (1, 0.5)), [0, -1], 0.002),
+        ("imp", ((0, 0, 0, 1), (0, 0, 0, 1)), (0, 1), [0, -1], 0.1),
+    ],
+)
+def test_forward_in_time_batch(method_fd, equation, boundary, bc_map, dt):
+    """Test if a batch of initial conditions/boundary constants gives the same results as separate problems."""
+    x = Symbol("x")
+    order_t = len(equation[1]) - 2
+    initial = [[x * (1 - x)] * order_t, [1] * order_t, [np.linspace(0, 1, 9)] * order_t]
+    bc_constants = [[0, 1], [2, -1], [1, 1]]
+    P = Fd_problem((0, 1), (0, 0.2), equation, boundary, initial[0], dx=0.1, dt=dt, method_fd=method_fd, bc_map=bc_map)
+    res = P.forward_in_time(initial=initial, bc_constants=bc_constants)
+    assert res.shape == (len(P.times), P.Nx, 3)
+    for member, (ic, consts) in enumerate(zip(initial, bc_constants)):
+        bcs = [(const,) + tuple(elem[1:]) for elem, const in zip(P.boundary, consts)]
+        Q = Fd_problem((0, 1), (0, 0.2), equation, bcs, ic, dx=0.1, dt=dt, method_fd=method_fd, bc_map=bc_map)
+        assert np.allclose(res[..., member], Q.forward_in_time()), f"wrong result for member {member}"
+    only_ic = P.forward_in_time(initial=initial[:1])
+    assert only_ic.shape[-1] == 1 and np.allclose(only_ic[..., 0], P.forward_in_time())
+    with pytest.raises(ValueError):
+        P.forward_in_time(initial=initial, bc_constants=bc_constants[:2])
+
+
+@pytest.mark.parametrize("solver", ["gmres", "bicgstab"])
+def test_forward_in_time_krylov(solver):
+    """Test if the iterative solvers give the same results as the banded LU and report their iterations."""
+    x = Symbol("x")
+    P = Fd_problem((0, 1), (0, 1), ((0, 0, 0, 1), (0, 0, 1)), (0, 0, 1, 1), x * (1 - x), bc_map=[0, 1, -2, -1])
+    expected = P.forward_in_time(acc_x=4)
+    assert P.iterations is None
+    res = P.forward_in_time(acc_x=4, solver=solver, solver_options={"rtol": 1e-12, "precond_bandwidth": 1})
+    assert np.allclose(res, expected)
+    assert len(P.iterations) == len(P.times) - 1 and all(count > 0 for count in P.iterations)
+    with pytest.raises(ValueError):
+        P.forward_in_time(solver="cholesky")
+
+
+@pytest.mark.parametrize(
+    "method_fd, equation, boundary, initial, bc_map, dt",
+    [
+        ("imp", ((0, 0, 0, 1), (0, 0, 1)), (1, (0, 1)), 1, [0, -1], 0.1),
+        ("exp", ((0, 0, 0, 1), (0, 0, 1)), (0, (1, 0.5)), 1, [0, -1], 0.004),
+        ("imp", ((0, 0, 0, 1), (0, 0, 0, 1)), (0, 0), (1, (0, 1)), [0, -1], 0.05),
+    ],
+)
+def test_solve_at(method_fd, equation, boundary, initial, bc_map, dt):
+    """Test if the propagator gives the same solution as marching in time."""
+    P = Fd_problem((0, 1), (0, 2), equation, boundary, initial, dx=0.1, dt=dt, method_fd=method_fd, bc_map=bc_map)
+    res = P.forward_in_time()
+    for idx in [0, len(P.times) // 3, len(P.times) - 1]:
+        assert np.allclose(P.solve_at(P.times[idx]), res[idx]), f"wrong solution at t={P.times[idx]}"
+    with pytest.raises(ValueError):
+        P.solve_at(-1)
+
+
+def test_solve_at_far():
+    """Test if the solution far after the interval reaches the steady state."""
+    P = Fd_problem((0, 1), (0, 1), ((0, 0, 0, 1), (0, 0, 1)), (0, 1), 5, dx=0.1, dt=0.1, bc_map=[0, -1])
+    assert np.allclose(P.solve_at(1e5), np.linspace(0.1, 0.9, 9))
+
+
+@pytest.mark.parametrize("save_every", [1, 7])
+def test_steady_state_stop(save_every, tmp_path):
+    """Test if marching stops once the solution stops changing (a backing file keeps the computed rows only)."""
+    P = Fd_problem((0, 1), (0, 100), ((0, 0, 0, 1), (0, 0, 1)), (0, 1), (0), dx=0.1, dt=0.1, bc_map=[0, -1])
+    res = P.forward_in_time(save_every=save_every, steady_tol=1e-10, steady_window=3)
+    assert P.stop_time < 10, f"expected an early stop, stopped at {P.stop_time}"
+    assert np.isclose(P.times[-1], P.stop_time) and len(P.times) == len(res)
+    assert np.allclose(res[-1], np.linspace(0.1, 0.9, 9)), f"expected a linear steady state, got {res[-1]}"
+    on_disk = P.forward_in_time(save_every=save_every, steady_tol=1e-10, steady_window=3, memmap=tmp_path / "u.npy")
+    assert isinstance(on_disk, np.memmap) and np.allclose(on_disk, res)
+    assert np.load(tmp_path / "u.npy").shape == res.shape and np.allclose(np.load(tmp_path / "u.npy"), res)
+    P.interval = (0, 1)  # No early stop, only the row reserved for one is dropped
+    full = P.forward_in_time(save_every=save_every, steady_tol=1e-30, memmap=tmp_path / "full.npy")
+    assert P.stop_time == pytest.approx(1) and np.load(tmp_path / "full.npy").shape == full.shape
+
+
+@pytest.mark.parametrize("shape, rows", [((1000, 9), 7), ((12, 3, 2), 12), ((5,), 0)])
+def test_truncate_npy(shape, rows, tmp_path):
+    """Test if .npy files are truncated in place to their first rows."""
+    data = np.arange(np.prod(shape), dtype=float).reshape(shape)
+    np.save(tmp_path / "a.npy", data)
+    _truncate_npy(tmp_path / "a.npy", rows)
+    loaded = np.load(tmp_path / "a.npy")
+    assert loaded.shape == (rows,) + shape[1:] and np.all(loaded == data[:rows])
+
+
+@pytest.mark.parametrize(
+    "equation, boundary, bc_map, acc_x, exact",
+    [
+        (((0, 0, 0, 1), (-2,)), (0, 0), [0, -1], 2, lambda x: x * (1 - x)),
+        (((5, 0, 0, 0, 0, 1), (2, 3)), (1, 1, 1, 1), [0, 1, -2, -1], 2, lambda x: np.ones_like(x)),
+        (((0, 0, 0, 1), (0, 0, 1)), (1, 3), [0, -1], 2, lambda x: 1 + 2 * x),
+    ],
+)
+def test_solve_steady(equation, boundary, bc_map, acc_x, exact):
+    """Test the direct solution of steady problems."""
+    P = Fd_problem((0, 1), (0, 1), equation, boundary, dx=0.1, bc_map=bc_map)
+    n = sum(np.array(bc_map) >= 0)
+    x = np.linspace(0, 1, 11)[n : n + P.Nx]
+    res = P.solve_steady(acc_x=acc_x)
+    assert np.allclose(res, exact(x)), f"expected {exact(x)} but got {res}"
+
+
+def test_spec():
+    """Test if problems can be built from specifications that pickle without the solution history."""
+    x = Symbol("x")
+    spec = Fd_spec((0, 1), (0, 1), ((0, 0, 0, 1), (0, 0, 1)), (0, (1, 1)), x * (1 - x), dt=0.01, bc_map=[0, -1])
+    loaded = pickle.loads(pickle.dumps(spec))
+    assert loaded.kwargs().keys() == spec.kwargs().keys() and loaded.boundary == spec.boundary
+    P = Fd_problem.from_spec(loaded)
+    res = P.forward_in_time()
+    assert np.allclose(res, Fd_problem(**spec.kwargs()).forward_in_time())
+    assert np.allclose(Fd_problem.from_spec(P.to_spec()).forward_in_time(), res)
+    dumped = pickle.dumps(P)
+    assert len(dumped) < res.nbytes, "the solution history should not be pickled"
+    Q = pickle.loads(dumped)
+    assert len(Q.solution) == 0 and Q.times is None
+    assert np.allclose(Q.forward_in_time(), res)
+
+
+@pytest.mark.parametrize("method_fd", ["cn", 0.3, 0.5])
+def test_theta_dense(method_fd):
+    """Test if theta schemes match marching with the dense matrices (non homogeneous boundaries)."""
+    x = Symbol("x")
+    P = Fd_problem(
+        (0, 1), (0, 0.2), ((0, 0, 0, 1), (0, 0, 1)), (1, 3), x * (1 - x), dx=0.1, dt=0.05, method_fd=method_fd,
+        bc_map=[0, -1],
+    )
+    res = P.forward_in_time()
+    theta = 0.5 if method_fd == "cn" else method_fd
+    lap = (np.eye(9, k=1) + np.eye(9, k=-1) - 2 * np.eye(9)) / 0.01
+    bc = np.zeros(9)
+    bc[[0, -1]] = [1 / 0.01, 3 / 0.01]
+    levels = [res[0]]
+    for _ in range(len(res) - 1):
+        rhs = levels[-1] / 0.05 + (1 - theta) * (lap @ levels[-1]) + bc
+        levels.append(np.linalg.solve(np.eye(9) / 0.05 - theta * lap, rhs))
+    assert np.allclose(res, levels)
+
+
+def test_crank_nicolson_order():
+    """Test if Crank-Nicolson is second order in time (and more accurate than implicit Euler)."""
+    points = np.linspace(0.01, 0.99, 99)
+    exact = 1 + 2 * points + np.sin(np.pi * points) * np.exp(-np.pi**2 * 0.1)
+    errors = {}
+    for method_fd in ["imp", "cn"]:
+        for dt in [0.02, 0.01]:
+            P = Fd_problem(
+                (0, 1), (0, 0.1), ((0, 0, 0, 1), (0, 0, 1)), (1, 3), [1 + 2 * points + np.sin(np.pi * points)],
+                dx=0.01, dt=dt, method_fd=method_fd, bc_map=[0, -1],
+            )
+            errors[method_fd, dt] = np.max(np.abs(P.forward_in_time()[-1] - exact))
+    assert errors["cn", 0.02] < errors["imp", 0.02] / 10
+    assert 3 < errors["cn", 0.02] / errors["cn", 0.01] < 5, f"expected second order, got errors {errors}"
+
+
+@pytest.mark.parametrize(
+    "method_fd, equation, method, dt, stencil",
+    [
+        ("imp", ((0, 0, 0, 1), (0, 0, 1)), ["cen", "for"], 0.01, {-1: 400, 0: -800, 1: 400}),
+        ("exp", ((0, 0, 0, 1), (0, 0, 1)), ["cen", "for"], 0.001, {-1: 400, 0: -800, 1: 400}),
+        ("imp", ((0, 0, -1), (0, 0, 1)), ["bac", "for"], 0.01, {-2: -10, -1: 40, 0: -30}),
+    ],
+)
+def test_periodic(method_fd, equation, method, dt, stencil):
+    """Test if the periodic mode matches marching with the dense circulant matrix (dx=0.05)."""
+    x = Symbol("x")
+    P = Fd_problem(
+        (0, 1), (0, 0.1), equation, None, (2 + x * (1 - x)) * x, dx=0.05, dt=dt,
+        method_fd=method_fd, method=method, periodic=True,
+    )
+    res = P.forward_in_time()
+    points = np.arange(20) * 0.05
+    assert P.Nx == 20 and np.allclose(res[0], (2 + points * (1 - points)) * points)
+    op = sum(val * np.roll(np.eye(20), k, axis=1) for k, val in stencil.items())
+    levels = [res[0]]
+    for _ in range(len(res) - 1):
+        if method_fd == "imp":
+            levels.append(np.linalg.solve(np.eye(20) / dt - op, levels[-1] / dt))
+        else:
+            levels.append(levels[-1] + dt * op @ levels[-1])
+    assert np.allclose(res, levels)
+    assert np.isclose(res[-1].mean(), res[0].mean()), "the mean should be conserved on a periodic domain"
+    assert np.allclose(P.solve_at(P.times[-1]), res[-1])
+
+
+def test_periodic_errors():
+    """Test the errors specific to periodic problems."""
+    with pytest.raises(ValueError):
+        Fd_problem((0, 1), (0, 1), ((0, 0, 0, 1), (0, 0, 1)), (0, 1), 0, bc_map=[0, -1], periodic=True)
+    P = Fd_problem((0, 1), (0, 1), ((0, 0, 0, 1), (0, 0, 1)), None, 0, dx=0.1, periodic=True)
+    with pytest.raises(NotImplementedError):
+        P.forward_in_time(solver="gmres")
+    with pytest.raises(ValueError):
+        P.forward_in_time(bc_constants=np.zeros((2, 2)))
@@ -2,9 +2,15 @@
 """Test methods of Expressions and TreeNode."""
 
 
+import pickle
+import os
+import pathlib
+import subprocess
+import sys
 import pytest
+import numpy as np
 from FDpy.expressions import Symbol, Number, Add, Sub, Mul, Div, Pow
-from FDpy.treenode import evaluate, postvisitor
+from FDpy.treenode import evaluate, postvisitor, postvisitor_all, simplify
 
 
 @pytest.fixture
@@ -160,3 +166,144 @@ def test_display(test_expr_print, idx):
     expr, result = test_expr_print[idx]
     print(str(expr))
     assert str(expr) == result, f"expected an evaluation of {result} for expression {expr}"
+
+
+@pytest.mark.parametrize("idx", [(0), (1), (2), (3), (4)])
+def test_compile(test_expr_eval, idx):
+    """Test if compiled expressions give the same results as the tree evaluation."""
+    expr, x, y, result = test_expr_eval[idx]
+    compiled = expr.compile()
+    assert compiled({"x": x, "y": y}) == postvisitor(expr, evaluate, symbol_map={"x": x, "y": y})
+    x_vals = np.linspace(1, 2, 5)
+    expected = postvisitor(expr, evaluate, symbol_map={"x": x_vals, "y": y})
+    assert np.all(compiled({"x": x_vals, "y": y}) == expected)
+
+
+def test_compile_deep():
+    """Test if very deep trees (longer than the recursion limit) can be compiled."""
+    x = Symbol("x")
+    expr = x
+    for _ in range(5000):
+        expr = expr + 1.5 * x
+    assert expr.compile()({"x": 2}) == 2 + 5000 * 3
+
+
+@pytest.mark.parametrize(
+    "expr, str_val",
+    [
+        (Add((Number(0), Symbol("x"))), "x"),
+        (Mul((Number(1), Symbol("x"))) / 1, "x"),
+        (2 * Symbol("x") + 3 * Symbol("x") - Symbol("x"), "4*x"),
+        (Symbol("x") + 1 + 2 * Number(3) - Symbol("y") * 0, "x+7"),
+        (Symbol("x") ** 1 + Symbol("y") ** Number(0), "x+1"),
+        (Symbol("x") - Symbol("x"), "0"),
+        ((4 * Symbol("x")) / 2 * 3, "6.0*x"),
+        ((Symbol("x") * 0.5) * 2, "x"),
+        (2 * (Symbol("x") * 0.5), "x"),
+        ((2 * Symbol("x")) / 2, "x"),
+        (0.5 * (0 * Symbol("y") + 2 * Symbol("x")) / 1, "x"),
+    ],
+)
+def test_simplify(expr, str_val):
+    """Test the simplification of expressions (printing hides products by 1, check there are none left)."""
+    simplified = postvisitor(expr, simplify)
+    assert str(simplified) == str_val, f"expected {str_val} but got {simplified}"
+
+    def identity(node, *o, **kwargs):
+        one = isinstance(node, Mul) and node.operands[0] == 1 or isinstance(node, (Mul, Div)) and node.operands[1] == 1
+        return one or any(o)
+
+    assert not postvisitor(simplified, identity), f"{simplified!r} still multiplies or divides by 1"
+
+
+@pytest.mark.parametrize("idx", [(0), (1), (2), (3), (4)])
+def test_simplify_evaluation(test_expr_eval, idx):
+    """Test if simplified expressions are evaluated to the same values."""
+    expr, x, y, result = test_expr_eval[idx]
+    simplified = postvisitor(expr, simplify)
+    assert postvisitor(simplified, evaluate, symbol_map={"x": x, "y": y}) == pytest.approx(result)
+
+
+def test_interning():
+    """Test that identical nodes are shared and hash structurally."""
+    x = Symbol("x")
+    assert Symbol("x") is x
+    assert Number(2) is Number(2)
+    assert Number(2) is not Number(2.0)
+    assert 2 * x + 1 is 2 * Symbol("x") + 1
+    assert 2 * x + 1 is not 2 * x - 1
+    counts = {}
+    for expr in [x + 1, Symbol("x") + 1, x * 2, Add((x, Number(1)))]:
+        counts[expr] = counts.get(expr, 0) + 1
+    assert counts == {x + 1: 3, x * 2: 1}
+    assert not hasattr(x, "__dict__") and not hasattr(x + 1, "__dict__")
+
+
+def test_interning_pickle():
+    """Test that pickled expressions come back as the interned nodes."""
+    expr = Symbol("x") ** 2 - Symbol("y") / 3
+    loaded = pickle.loads(pickle.dumps(expr))
+    assert loaded is expr
+    assert postvisitor(loaded, evaluate, symbol_map={"x": 2, "y": 3}) == 3
+
+
+def test_interning_pickle_hash_seed():
+    """Test that unpickling in a process with another hash seed keeps the hashes of that process."""
+    root = pathlib.Path(__file__).resolve().parents[2]
+    dumped = subprocess.run(
+        [sys.executable, "-c", "import pickle, sys; from FDpy.expressions import Symbol; "
+         "sys.stdout.buffer.write(pickle.dumps(Symbol('x') * Symbol('y') + 1))"],
+        capture_output=True, check=True, cwd=root, env={**os.environ, "PYTHONHASHSEED": "1"},
+    ).stdout
+    code = (
+        "import pickle, sys; from FDpy.expressions import Symbol; "
+        "expr = Symbol('x') * Symbol('y') + 1; d = {expr: 1}; "
+        "loaded = pickle.loads(sys.stdin.buffer.read()); "
+        "assert loaded is expr and expr in d and hash(loaded) == hash((type(expr), expr.operands))"
+    )
+    subprocess.run(
+        [sys.executable, "-c", code], input=dumped, check=True, cwd=root, env={**os.environ, "PYTHONHASHSEED": "2"}
+    )
+
+
+def test_unhashable_operands():
+    """Test that nodes holding arrays are still built but are not interned."""
+    x = Symbol("x")
+    arr = np.arange(3)
+    expr = Add((x, arr))
+    assert Add((x, arr)) is not expr
+    with pytest.raises(TypeError):
+        hash(expr)
+    assert np.all(postvisitor(expr, evaluate, symbol_map={"x": 1}) == arr + 1)
+
+
+def test_postvisitor_deep():
+    """Test that postvisitor does not hit the recursion limit on deep trees."""
+    x = Symbol("x")
+    expr = x
+    for i in range(20000):
+        expr = expr * 1 + i
+    assert postvisitor(expr, evaluate, symbol_map={"x": 1}) == 1 + sum(range(20000))
+
+
+def test_postvisitor_shared():
+    """Test that shared subtrees are visited only once."""
+    visited = []
+
+    def count(expr, *o, **kwargs):
+        visited.append(expr)
+        return evaluate(expr, *o, **kwargs)
+
+    h = Symbol("h")
+    shared = h**2 * 3
+    expr = (shared + 1) / shared - shared
+    assert postvisitor(expr, count, symbol_map={"h": 2}) == pytest.approx(13 / 12 - 12)
+    assert len(visited) == 9
+
+
+def test_postvisitor_all_generator():
+    """Test that trees built on the fly (freed after their visit) do not share results."""
+    x = Symbol("x")
+    values = np.random.default_rng(0).uniform(0, 1, 1000)
+    res = postvisitor_all((x + float(v) for v in values), evaluate, symbol_map={"x": 0.0})
+    assert np.all(np.array(res) == values)
@@ -5,7 +5,9 @@
 import pytest
 from FDpy.expressionlist import ExpressionList
 from FDpy.expressions import Symbol
+from FDpy.treenode import evaluate, postvisitor_all
 from functools import singledispatch
+import numpy as np
 
 x = Symbol("x")
 
@@ -75,6 +77,36 @@ def test_call(d1, x_val, call_val):
     assert val == call_val, f"expected {call_val} but got {val}"
 
 
+def test_call_shared():
+    """Test that a denominator shared by all the diagonals is evaluated once."""
+    h = Symbol("h")
+    d1 = ExpressionList({-1: 1 / h**2, 0: -2 / h**2, 1: 1 / h**2})
+    visited = []
+
+    def count(expr, *o, **kwargs):
+        visited.append(expr)
+        return evaluate(expr, *o, **kwargs)
+
+    val = postvisitor_all(d1.expr_dict.values(), count, symbol_map={"h": 0.5})
+    assert val == [4, -8, 4]
+    assert sum(elem is h**2 for elem in visited) == 1
+    assert d1(0.5, "h") == ExpressionList({-1: 4, 0: -8, 1: 4})
+
+
+def test_arrays():
+    """Test the sorted offsets/values storage and its symbolic fallback."""
+    d1 = ExpressionList({1: 4, -1: 6.5, 0: 5})
+    assert d1.offsets.tolist() == [-1, 0, 1] and d1.values.dtype == float
+    d2 = ExpressionList({2: Symbol("x"), 0: 1})
+    assert d2.values.dtype == object
+    summed = d1 + d2
+    assert summed.offsets.tolist() == [-1, 0, 1, 2]
+    assert summed(2, "x") == {-1: 6.5, 0: 6, 1: 4, 2: 2}
+    assert summed(2, "x").values.dtype != object
+    assert np.all((d1 * 2).values == [13, 10, 8])
+    assert (d1 - d1)(0, "x") == {}
+
+
 @pytest.mark.parametrize(
     "x_dict, t_dict, mat, rhs_x, rhs_t, bc_x",
     [
@@ -93,6 +125,31 @@ def test_combine_x_and_t(x_dict, t_dict, mat, rhs_x, rhs_t, bc_x):
     assert b == bc_x, f"Wrong bc (x), expected{bc_x} but got {b}"
 
 
+@pytest.mark.parametrize(
+    "method_time, mat, rhs_x, bc_x",
+    [
+        ("cn", {-1: -0.5, 0: 3, 1: -0.5}, {-1: 0.5, 0: -1, 1: 0.5}, {-1: 0.5, 1: 0.5}),
+        (0.75, {-1: -0.75, 0: 3.5, 1: -0.75}, {-1: 0.25, 0: -0.5, 1: 0.25}, {-1: 0.75, 1: 0.75}),
+        (0, {0: 2}, {-1: 1, 0: -2, 1: 1}, {-1: 1, 1: 1}),
+        (1.0, {-1: -1, 0: 4, 1: -1}, None, {-1: 1, 1: 1}),
+    ],
+)
+def test_combine_x_and_t_theta(method_time, mat, rhs_x, bc_x):
+    """Test the split of the x terms between both sides for theta schemes."""
+    m, r1, r2, b = ExpressionList({0: -2, 1: 1, -1: 1}).combine_x_and_t(ExpressionList({0: -2, 1: 2}), method_time)
+    assert m == mat, f"Wrong matrix, expected{mat} but got {m}"
+    assert r1 == rhs_x, f"Wrong rhs (x), expected{rhs_x} but got {r1}"
+    assert r2 == {0: 2}, f"Wrong rhs (t), expected{ {0: 2} } but got {r2}"
+    assert b == bc_x, f"Wrong bc (x), expected{bc_x} but got {b}"
+
+
+@pytest.mark.parametrize("method_time", ["bdf", 1.5, -0.5])
+def test_combine_x_and_t_error(method_time):
+    """Test if unknown time schemes lead to an error."""
+    with pytest.raises(NotImplementedError):
+        ExpressionList({0: 1}).combine_x_and_t(ExpressionList({0: 1, 1: 1}), method_time)
+
+
 x = ExpressionList({0: 1, -1: 2, 1: 3})
 t = ExpressionList({0: 4, 1: 5})
 a = x.combine_x_and_t(t, "imp")
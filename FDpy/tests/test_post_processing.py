@@ -0,0 +1,62 @@
+"""Test the post processing functions."""
+
+
+import pytest
+import pathlib
+import subprocess
+import sys
+import numpy as np
+from FDpy.post_processing import add_boundary, start_animation
+
+
+@pytest.mark.parametrize(
+    "u_mat, boundary, bc_map, exp_res",
+    [
+        ([1, 2, 3], [range(0, 1), (4, 1)], [0, -1], [0, 1, 2, 3, 7]),
+        ([[1, 2, 3], [4, 5, 6]], [range(0, 1), (4, 1)], [0, -1], [[0, 1, 2, 3, 7], [0, 4, 5, 6, 10]]),
+        ([[1, 2, 3]], [(1, 2, 1), range(5, 6), range(6, 7)], [1, 0, -1], [[5, 5, 1, 2, 3, 6]]),
+        ([[1, 2, 3], [4, 5, 6]], None, None, [[1, 2, 3, 1], [4, 5, 6, 4]]),
+    ],
+)
+def test_add_boundary(u_mat, boundary, bc_map, exp_res):
+    """Test if boundary points are added to one or all time steps of the solution."""
+    res = add_boundary(u_mat, boundary, bc_map)
+    assert np.all(res == np.array(exp_res)), f"expected {exp_res} but got {res}"
+
+
+def test_error_without_copy():
+    """Test that the error is computed directly from the solution array."""
+    u_mat = np.arange(9.0).reshape((3, 3))
+    exact = np.hstack((np.zeros((3, 1)), u_mat, np.zeros((3, 1)))).T
+    kwargs = dict(interval=300, xlabel="X", ylabel="U", label="", exact_label="", xlim=None, ylim=None, fps=30)
+    err = start_animation(
+        (0, 1), (0, 0.5), 0.25, 0.25, u_mat, exact, [range(0, 1)] * 2, [0, -1],
+        save=False, filename=None, error=True, anim=False, jup=False, **kwargs
+    )
+    assert err == 0, f"expected no error but got {err}"
+
+
+def test_error_decimated():
+    """Test if the exact solution is compared at the times of a decimated solution."""
+    times = np.array([0, 0.5])
+    u_mat = np.ones((2, 3)) * times[:, None]
+    exact_mat = np.ones((5, 3)) * np.array([0, 0.25, 0.5])
+    kwargs = dict(interval=300, xlabel="X", ylabel="U", label="", exact_label="", xlim=None, ylim=None, fps=30)
+    for exact in (lambda x, t: t, exact_mat):
+        err = start_animation(
+            (0, 1), (0, 0.5), 0.25, 0.25, u_mat, exact, [(0, 1), (0, 1)], [0, -1],
+            save=False, filename=None, error=True, anim=False, jup=False, times=times, **kwargs
+        )
+        assert np.isclose(err, 0), f"expected no error but got {err}"
+
+
+def test_import_is_light():
+    """Test that importing FDpy does not import the plotting stack (checked on the import time trace)."""
+    root = pathlib.Path(__file__).resolve().parents[2]
+    cmd = [sys.executable, "-X", "importtime", "-c", "import FDpy"]
+    res = subprocess.run(cmd, capture_output=True, text=True, cwd=root)
+    assert res.returncode == 0, res.stderr
+    imported = [line.split("|")[-1].strip() for line in res.stderr.splitlines() if line.startswith("import time:")]
+    assert "FDpy" in imported
+    heavy = [name for name in imported if name.split(".")[0] in ("matplotlib", "IPython")]
+    assert not heavy, f"importing FDpy should not import {heavy}"
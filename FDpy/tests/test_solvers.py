@@ -0,0 +1,138 @@
+"""Test the linear solvers used when marching in time."""
+
+
+import pytest
+import numpy as np
+from scipy.sparse import diags
+from FDpy.solvers import solvers
+from FDpy.solvers import BandedLU, KrylovSolver, StencilOperator, CirculantSolver, DiagonalSolver
+
+
+@pytest.mark.parametrize(
+    "offsets, n_rhs",
+    [
+        ((-1, 0, 1), None),
+        ((-2, -1, 0, 1), 3),
+        ((0, 1, 2, 3), None),
+    ],
+)
+def test_banded_lu(offsets, n_rhs):
+    """Test if the banded factorization gives the same solution as a dense solve."""
+    rng = np.random.default_rng(0)
+    size = 12
+    values = [rng.uniform(-1, 1, size) + (10 if off == 0 else 0) for off in offsets]
+    matrix = diags(values, offsets, shape=(size, size), format="lil")
+    matrix[0, 5] += 2  # Entries added by boundary conditions widen the band
+    matrix[-1, -4] += -3
+    rhs = rng.uniform(-1, 1, size if n_rhs is None else (size, n_rhs))
+    expected = np.linalg.solve(matrix.toarray(), rhs)
+    computed = BandedLU(matrix).solve(rhs)
+    assert computed.shape == expected.shape
+    assert np.allclose(computed, expected), f"expected {expected} but got {computed}"
+
+
+def test_banded_lu_singular():
+    """Test if a singular matrix leads to an error."""
+    with pytest.raises(np.linalg.LinAlgError):
+        BandedLU(diags([1.0, 1.0, 0.0, 1.0], 0))
+
+
+@pytest.mark.parametrize(
+    "method, precond_bandwidth, n_rhs",
+    [
+        ("gmres", 1, None),
+        ("bicgstab", 1, 2),
+        ("gmres", None, 2),
+        ("bicgstab", 0, None),
+    ],
+)
+def test_krylov(method, precond_bandwidth, n_rhs):
+    """Test if the iterative solvers give the solution of a dense solve and count their iterations."""
+    rng = np.random.default_rng(1)
+    size = 30
+    offsets = (-4, -2, -1, 0, 1, 2, 4)
+    values = [rng.uniform(-0.5, 0.5, size) + (6 if off == 0 else 0) for off in offsets]
+    matrix = diags(values, offsets, shape=(size, size))
+    rhs = rng.uniform(-1, 1, size if n_rhs is None else (size, n_rhs))
+    expected = np.linalg.solve(matrix.toarray(), rhs)
+    solver = KrylovSolver(matrix, method, rtol=1e-12, precond_bandwidth=precond_bandwidth)
+    computed = solver.solve(rhs)
+    assert computed.shape == expected.shape
+    assert np.allclose(computed, expected), f"expected {expected} but got {computed}"
+    assert len(solver.iterations) == 1 and solver.iterations[0] > 0
+    solver.solve(rhs, x0=expected)  # Warm start from the solution
+    assert solver.iterations[1] < solver.iterations[0]
+
+
+@pytest.mark.parametrize("method, precond_bandwidth", [("gmres", 1), ("bicgstab", 2), ("gmres", None)])
+def test_stencil_operator(method, precond_bandwidth):
+    """Test if the matrix-free stencil (with boundary corrections) acts and solves as the assembled matrix."""
+    rng = np.random.default_rng(3)
+    size = 25
+    offsets = np.array([-3, -1, 0, 1, 2, 40])  # The last one is outside the matrix
+    values = rng.uniform(-0.5, 0.5, len(offsets)) + 6 * (offsets == 0)
+    correction = np.zeros((size, size))
+    correction[0, :3] = [1.0, -0.5, 0.25]
+    correction[-1, -4:] = [0.3, 0.0, -1.0, 2.0]
+    matrix = diags(values[:-1], offsets[:-1], shape=(size, size)).toarray() + correction
+    operator = StencilOperator(offsets, values, size, correction)
+    vec = rng.uniform(-1, 1, size)
+    assert np.allclose(operator @ vec, matrix @ vec)
+    band = np.where(np.abs(np.subtract.outer(np.arange(size), np.arange(size))) <= 2, matrix, 0)
+    assert np.allclose(operator.band(2).toarray(), band)
+    solver = KrylovSolver(operator, method, rtol=1e-12, precond_bandwidth=precond_bandwidth)
+    assert np.allclose(solver.solve(vec), np.linalg.solve(matrix, vec))
+
+
+def test_krylov_half_step():
+    """Test if bicgstab converging at the half step of its first iteration counts one iteration."""
+    matrix = diags([-1.0, 4.0, -1.0], [-1, 0, 1], shape=(10, 10))
+    solver = KrylovSolver(matrix, "bicgstab")  # The preconditioner is the exact inverse
+    rhs = np.arange(10.0)
+    assert np.allclose(solver.solve(rhs), np.linalg.solve(matrix.toarray(), rhs))
+    solver.solve(rhs, x0=np.linalg.solve(matrix.toarray(), rhs))
+    assert solver.iterations == [1, 0]
+
+
+@pytest.mark.parametrize("info", [-10, 5])
+def test_krylov_not_converged(info, monkeypatch):
+    """Test if any failure reported by the iterative method leads to an error."""
+    monkeypatch.setitem(solvers._KRYLOV_METHODS, "gmres", lambda A, b, **kwargs: (np.zeros_like(b), info))
+    with pytest.raises(np.linalg.LinAlgError):
+        KrylovSolver(diags([1.0, 2.0], 0)).solve(np.ones(2))
+
+
+def test_krylov_wrong_method():
+    """Test if unknown iterative methods lead to an error."""
+    with pytest.raises(ValueError):
+        KrylovSolver(diags([1.0, 2.0], 0), "cg")
+
+
+@pytest.mark.parametrize("size, n_rhs", [(16, None), (15, 3)])
+def test_circulant(size, n_rhs):
+    """Test if the FFT solve of a circulant system gives the same solution as a dense solve."""
+    rng = np.random.default_rng(2)
+    offsets = np.array([-2, -1, 0, 1, 3])
+    values = rng.uniform(-1, 1, len(offsets)) + 6 * (offsets == 0)
+    matrix = sum(val * np.roll(np.eye(size), off, axis=1) for off, val in zip(offsets, values))
+    rhs = rng.uniform(-1, 1, size if n_rhs is None else (size, n_rhs))
+    expected = np.linalg.solve(matrix, rhs)
+    computed = CirculantSolver(offsets, values, size).solve(rhs)
+    assert computed.shape == expected.shape
+    assert np.allclose(computed, expected), f"expected {expected} but got {computed}"
+
+
+def test_circulant_singular():
+    """Test if a singular circulant matrix (e.g. a periodic Laplacian) leads to an error."""
+    with pytest.raises(np.linalg.LinAlgError):
+        CirculantSolver(np.array([-1, 0, 1]), np.array([1.0, -2.0, 1.0]), 10)
+
+
+def test_diagonal():
+    """Test if diagonal systems are solved by a division, for one or many right hand sides."""
+    diagonal = np.array([2.0, -4.0, 0.5])
+    rhs = np.arange(6.0).reshape(3, 2)
+    assert np.allclose(DiagonalSolver(diagonal).solve(rhs), rhs / diagonal[:, None])
+    assert np.allclose(DiagonalSolver(diagonal).solve(rhs[:, 0]), rhs[:, 0] / diagonal)
+    with pytest.raises(np.linalg.LinAlgError):
+        DiagonalSolver([1.0, 0.0])
@@ -0,0 +1,68 @@
+"""Test the parallel sweeps over finite difference problems."""
+
+
+import multiprocessing
+import pytest
+import numpy as np
+from FDpy.fd_problem import Fd_problem
+from FDpy.sweep import sweep, config_grid
+from FDpy.utils import utils
+
+
+def _last_step(problem, mat_u):
+    """Reduction keeping the last time step, and the stencils derived by the worker."""
+    return mat_u[-1], utils._cached_exprlist.cache_info().misses
+
+
+@pytest.fixture
+def configs():
+    """Grid of diffusion problems."""
+    base = {
+        "domain": (0, 1),
+        "interval": (0, 0.5),
+        "equation": ((0, 0, 0, 1), (0, 0, 1)),
+        "boundary": (0, 1),
+        "initial": 1,
+        "bc_map": [0, -1],
+        "save_every": 2,
+    }
+    return config_grid(base, dx=[0.1, 0.05], dt=[0.1, 0.05], acc_x=[2, 4])
+
+
+def test_config_grid(configs):
+    """Test if all combinations are generated."""
+    assert len(configs) == 8
+    assert {(c["dx"], c["dt"], c["acc_x"]) for c in configs} == {
+        (dx, dt, acc) for dx in [0.1, 0.05] for dt in [0.1, 0.05] for acc in [2, 4]
+    }
+
+
+def test_sweep(configs):
+    """Test if the sweep gives the results of the problems solved one by one."""
+    configs = [dict(c, boundary=(0, 1) if c["acc_x"] == 2 else (0, 0, 1, 1)) for c in configs]
+    for c in configs:
+        c["bc_map"] = [0, -1] if c["acc_x"] == 2 else [0, 1, -2, -1]
+    results = list(sweep(configs, max_workers=2))
+    assert sorted(idx for idx, _, _ in results) == list(range(len(configs)))
+    for idx, times, mat_u in results:
+        args = {k: v for k, v in configs[idx].items() if k not in ("save_every", "acc_x")}
+        P = Fd_problem(**args)
+        expected = P.forward_in_time(acc_x=configs[idx]["acc_x"], save_every=2)
+        assert np.allclose(times, P.times) and np.allclose(mat_u, expected)
+
+
+def test_sweep_reduce(configs):
+    """Test if reductions are returned and if workers reuse the stencils derived by the main process."""
+    configs = [c for c in configs if c["acc_x"] == 2]
+    context = multiprocessing.get_context("spawn")  # Workers do not inherit the caches of this process
+    for idx, _, (last, derived) in sweep(configs, reduce=_last_step, max_workers=2, mp_context=context):
+        assert last.shape == (int(np.round(1 / configs[idx]["dx"])) - 1,)
+        assert derived == 0, "workers should not derive the stencils again"
+
+
+def test_sweep_solver(configs):
+    """Test if the linear solver can be chosen in the configurations."""
+    configs = [dict(c, solver="gmres", solver_options={"rtol": 1e-12}) for c in configs if c["acc_x"] == 2]
+    for idx, _, mat_u in sweep(configs, max_workers=2):
+        args = {k: v for k, v in configs[idx].items() if k not in ("save_every", "acc_x", "solver", "solver_options")}
+        assert np.allclose(mat_u, Fd_problem(**args).forward_in_time(save_every=2))
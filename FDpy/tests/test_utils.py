@@ -1,8 +1,10 @@
 """Test functions in Fdproblem class."""
 
 
+import math
 import pytest
-from FDpy.utils import _x_or_t_to_epxrlist
+from FDpy.utils import _x_or_t_to_epxrlist, set_stencil_cache_dir, clear_stencil_cache
+from FDpy.utils import utils
 from FDpy.expressionlist import ExpressionList
 import numpy as np
 
@@ -119,3 +121,51 @@ def test_x_x_or_t_to_epxrlist(eq, methodx, acc, order_t, dic, str_val):
     act_coef = act_coef.round_vals()
     true_coef = ExpressionList(dic)
     assert (str(act_expr) == str_val) and (true_coef == act_coef), f"expected {str_val} but got {str(act_expr)}"
+
+
+def test_stencil_cache(tmp_path, monkeypatch):
+    """Test if stencils are computed once, returned as independent copies, and stored on disk if asked."""
+    clear_stencil_cache()
+    _, first, _ = _x_or_t_to_epxrlist((0, 0, 0, 1), "cen", "dx", 0.1, acc=2, order_t=1)
+    first.clean(first.expr_dict[0])  # Modifying the copy returned does not affect the cache
+    _, second, _ = _x_or_t_to_epxrlist((0, 0, 0, 1), "cen", "dx", 0.1, acc=2, order_t=1)
+    assert utils._cached_exprlist.cache_info().hits == 1
+    assert second.round_vals() == ExpressionList({0: -200, 1: 100, -1: 100})
+
+    set_stencil_cache_dir(tmp_path)
+    try:
+        clear_stencil_cache()
+        coeffs = utils._compute_coefficients(2, 2, [0, 1, -1])
+        assert len(list(tmp_path.glob("*.npy"))) == 1
+        clear_stencil_cache()
+        monkeypatch.setattr(utils, "_fornberg", None)  # Coefficients now have to be read from the disk
+        assert np.all(utils._compute_coefficients(2, 2, [0, 1, -1]) == coeffs)
+    finally:
+        set_stencil_cache_dir(None)
+        clear_stencil_cache()
+
+
+def test_fornberg_batch():
+    """Test if the weights of every stencil give the exact derivatives of polynomials up to its degree."""
+    rng = np.random.default_rng(0)
+    points = np.cumsum(rng.uniform(0.1, 1, (6, 5)), axis=1) * rng.choice([-1, 1], (6, 1))
+    x0 = rng.uniform(-1, 1, 6)
+    batch = utils._fornberg_batch(4, 3, points, x0)
+    assert batch.shape == (6, 5, 5, 4)
+    for s in range(len(points)):
+        for n in range(5):  # Stencil of the first n + 1 points, exact for x^k with k <= n
+            assert np.all(batch[s, n, n + 1 :] == 0)
+            for m in range(4):
+                for k in range(n + 1):
+                    exact = 0 if k < m else math.factorial(k) / math.factorial(k - m) * x0[s] ** (k - m)
+                    assert np.isclose(np.sum(batch[s, n, : n + 1, m] * points[s, : n + 1] ** k), exact)
+
+
+def test_grid_weights():
+    """Test the weights at every node of uniform/non-uniform grids."""
+    idx, weights = utils._grid_weights(np.linspace(0, 1, 6), 2, 3)
+    assert np.all(idx[0] == [0, 1, 2]) and np.all(idx[3] == [2, 3, 4]) and np.all(idx[-1] == [3, 4, 5])
+    assert np.allclose(weights, np.array([1, -2, 1]) * 25)
+    grid = np.array([0, 0.1, 0.15, 0.4, 0.5, 0.8, 1])
+    idx, weights = utils._grid_weights(grid, 1, 3)
+    assert np.allclose(np.sum(weights * grid[idx] ** 2, axis=1), 2 * grid), "Derivative of x^2 should be exact."
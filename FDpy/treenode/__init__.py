@@ -1 +1 @@
-from .treenode import evaluate, postvisitor
+from .treenode import evaluate, postvisitor, postvisitor_all, simplify
@@ -3,6 +3,7 @@
 
 from ..expressions import expressions, Expressions, Number
 from functools import singledispatch
+import numbers
 
 
 class TreeNode:
@@ -31,10 +32,42 @@ class TreeNode:
 
 
 def postvisitor(expr, fn, **kwargs):
-    """Define how the Tree is going to be read (starting from terminal in this case)."""
-    if not isinstance(expr, Expressions):
-        expr = Number(expr)
-    return fn(expr, *(postvisitor(c, fn, **kwargs) for c in expr.operands), **kwargs)
+    """Define how the Tree is going to be read (starting from terminal in this case).
+
+    The tree is walked with an explicit stack, so deep expressions do not hit the
+    recursion limit, and a subtree shared in several places is only visited once.
+    """
+    return _postvisit(expr, fn, {}, kwargs)
+
+
+def postvisitor_all(exprs, fn, **kwargs):
+    """Apply postvisitor to every expression in exprs, return the list of results.
+
+    All the trees are visited together: a subtree common to several of them (e.g. a
+    shared denominator h**2) is only visited once.
+    """
+    memo = {}
+    return [_postvisit(expr, fn, memo, kwargs) for expr in exprs]
+
+
+def _postvisit(expr, fn, memo, kwargs):
+    """Apply fn to expr after its operands.
+
+    memo maps the id of visited nodes to (node, result), holding the node keeps its
+    id from being reused by a new node while memo is alive (e.g. trees built on the fly).
+    """
+    stack = [(expr, False)]
+    while stack:
+        node, operands_done = stack.pop()
+        if id(node) in memo:
+            continue
+        wrapped = node if isinstance(node, Expressions) else Number(node)
+        if operands_done or not wrapped.operands:
+            memo[id(node)] = (node, fn(wrapped, *(memo[id(c)][1] for c in wrapped.operands), **kwargs))
+        else:
+            stack.append((node, True))
+            stack.extend((c, False) for c in reversed(wrapped.operands) if id(c) not in memo)
+    return memo[id(expr)][1]
 
 
 @singledispatch
@@ -76,3 +109,119 @@ def _(expr, *o, **kwargs):
 @evaluate.register(expressions.Pow)
 def _(expr, *o, **kwargs):
     return o[0] ** o[1]
+
+
+def _is_number(expr, value=None):
+    """Check if expr is a Number holding a scalar (equal to value if specified)."""
+    if not isinstance(expr, Number) or not isinstance(expr.value, numbers.Number):
+        return False
+    return value is None or expr.value == value
+
+
+def _fold(expr, *o):
+    """Replace an operator acting on two numbers by the resulting Number."""
+    return Number(evaluate(expr, o[0].value, o[1].value))
+
+
+def _sum_terms(expr):
+    """Flatten a sum into a list of (coefficient, term) where term is None for constants."""
+    terms = []
+    stack = [(expr, 1)]
+    while stack:
+        node, sign = stack.pop()
+        if isinstance(node, (expressions.Add, expressions.Sub)):
+            stack.append((node.operands[1], sign if isinstance(node, expressions.Add) else -sign))
+            stack.append((node.operands[0], sign))
+        elif _is_number(node):
+            terms.append((sign * node.value, None))
+        elif isinstance(node, expressions.Mul) and _is_number(node.operands[0]):
+            terms.append((sign * node.operands[0].value, node.operands[1]))
+        else:
+            terms.append((sign, node))
+    return terms
+
+
+@singledispatch
+def simplify(expr, *o, **kwargs):
+    """Simplify a node whose operands (o) are already simplified, use as postvisitor(expr, simplify).
+
+    Numeric subtrees are folded, identities (0+x, 1*x, x/1, x^1, ...) are dropped,
+    and sums are flattened with their like terms combined.
+    """
+    raise NotImplementedError(f"Cannot simplify a {type(expr).__name__}")
+
+
+@simplify.register(expressions.Terminal)
+def _(expr, *o, **kwargs):
+    return expr
+
+
+@simplify.register(expressions.Add)
+@simplify.register(expressions.Sub)
+def _(expr, *o, **kwargs):
+    if _is_number(o[0]) and _is_number(o[1]):
+        return _fold(expr, *o)
+    combined = {}
+    for coef, term in _sum_terms(type(expr)(o)):
+        key = term
+        try:
+            hash(term)  # Nodes hash structurally, like terms share a key
+        except TypeError:
+            key = id(term)
+        if key in combined:
+            combined[key][0] += coef
+        else:
+            combined[key] = [coef, term]
+    res = None
+    for coef, term in combined.values():
+        if coef == 0:
+            continue
+        node = Number(coef) if term is None else (term if coef == 1 else Number(coef) * term)
+        res = node if res is None else res + node
+    return Number(0) if res is None else res
+
+
+@simplify.register(expressions.Mul)
+def _(expr, *o, **kwargs):
+    a, b = o
+    if _is_number(a) and _is_number(b):
+        return _fold(expr, *o)
+    if _is_number(a, 0) or _is_number(b, 0):
+        return Number(0)
+    if _is_number(a, 1):
+        return b
+    if _is_number(b, 1):
+        return a
+    if _is_number(b):  # Coefficients first
+        a, b = b, a
+    if _is_number(a) and isinstance(b, expressions.Mul) and _is_number(b.operands[0]):
+        coef, rest = Number(a.value * b.operands[0].value), b.operands[1]
+        return simplify(expressions.Mul((coef, rest)), coef, rest)  # The folded coefficient can be 0 or 1
+    return expressions.Mul((a, b))
+
+
+@simplify.register(expressions.Div)
+def _(expr, *o, **kwargs):
+    a, b = o
+    if _is_number(a) and _is_number(b):
+        return _fold(expr, *o)
+    if _is_number(a, 0):
+        return Number(0)
+    if _is_number(b, 1):
+        return a
+    if _is_number(b) and isinstance(a, expressions.Mul) and _is_number(a.operands[0]):
+        coef, rest = Number(a.operands[0].value / b.value), a.operands[1]
+        return simplify(expressions.Mul((coef, rest)), coef, rest)
+    return expressions.Div((a, b))
+
+
+@simplify.register(expressions.Pow)
+def _(expr, *o, **kwargs):
+    a, b = o
+    if _is_number(a) and _is_number(b):
+        return _fold(expr, *o)
+    if _is_number(b, 0) or _is_number(a, 1):
+        return Number(1)
+    if _is_number(b, 1):
+        return a
+    return expressions.Pow((a, b))
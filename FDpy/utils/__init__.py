@@ -1,3 +1,4 @@
 from .utils import _equ_to_exprlist
 from .utils import _x_or_t_to_epxrlist
 from .utils import _exprlist_to_mat
+from .utils import set_stencil_cache_dir, clear_stencil_cache, export_stencil_cache, seed_stencil_cache
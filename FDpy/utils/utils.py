@@ -4,7 +4,18 @@
 
 from ..expressions import Symbol
 from ..expressionlist import ExpressionList
+from ..treenode import postvisitor, simplify
+from functools import lru_cache
 import numpy as np
+import hashlib
+import os
+import pathlib
+
+
+STENCIL_CACHE_SIZE = 512
+_stencil_cache_dir = None
+_derived_keys = {}  # Inputs of the stencils derived in this process (ordered set), see export_stencil_cache
+_seeded_exprlists = {}  # Stencils derived in other processes, see seed_stencil_cache
 
 
 def _compute_str_eq(coeffs, index):
@@ -43,33 +54,143 @@ def _sum_sides(equation, idx):
     return constant
 
 
+def set_stencil_cache_dir(directory=None):
+    """Store the finite difference coefficients computed in a directory (None to disable).
+
+    The coefficients are always kept in memory (LRU cache of size STENCIL_CACHE_SIZE),
+    the directory allows to share them between processes/sessions.
+    """
+    global _stencil_cache_dir
+    _stencil_cache_dir = None if directory is None else pathlib.Path(directory)
+    if _stencil_cache_dir is not None:
+        _stencil_cache_dir.mkdir(parents=True, exist_ok=True)
+
+
+def clear_stencil_cache():
+    """Clear the in-memory caches of finite difference coefficients and ExpressionLists."""
+    _cached_coefficients.cache_clear()
+    _cached_exprlist.cache_clear()
+    _derived_keys.clear()
+    _seeded_exprlists.clear()
+
+
+def export_stencil_cache():
+    """Return the stencils (ExpressionLists) derived in this process, see seed_stencil_cache.
+
+    The result is picklable, it is meant to be sent to other processes (e.g. workers
+    of a process pool) to avoid deriving the same stencils again.
+    """
+    return {key: _cached_exprlist(*key) for key in _derived_keys}
+
+
+def seed_stencil_cache(entries):
+    """Add stencils derived in another process (see export_stencil_cache) to the cache."""
+    _seeded_exprlists.update(entries)
+
+
 def _compute_coefficients(accuracy, order, points, x0=0):
+    """Return the coefficients of FD (Bengt Fornberg algorythm), computed only once for given inputs.
+
+    The array returned is shared between calls and is therefore read-only.
+    """
+    return _cached_coefficients(int(accuracy), int(order), tuple(points), x0)
+
+
+@lru_cache(maxsize=STENCIL_CACHE_SIZE)
+def _cached_coefficients(accuracy, order, points, x0):
+    """Look for the coefficients on disk (if enabled) before computing them."""
+    if _stencil_cache_dir is not None:
+        key = hashlib.sha1(repr((accuracy, order, points, x0)).encode()).hexdigest()
+        path = _stencil_cache_dir / f"fornberg_{key}.npy"
+        if path.exists():
+            coeffs = np.load(path)
+        else:
+            coeffs = _fornberg(accuracy, order, points, x0)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, coeffs)
+            os.replace(tmp_path, path)  # Other processes never read a file partially written
+    else:
+        coeffs = _fornberg(accuracy, order, points, x0)
+    coeffs.flags.writeable = False
+    return coeffs
+
+
+def _fornberg(accuracy, order, points, x0=0):
     """Implement Bengt Fornberg algorythm to find coefficients of FD."""
-    coeffs = np.zeros((accuracy + 1, accuracy + 1, min(order, accuracy) + 1))
-    coeffs[0, 0, 0] = 1
-    c1 = 1
+    return _fornberg_batch(accuracy, order, np.asarray(points)[None, : accuracy + 1], x0)[0]
+
+
+def _fornberg_batch(accuracy, order, points, x0=0):
+    """Apply Bengt Fornberg algorythm to many stencils at once.
+
+    Parameters
+    ----------
+    accuracy : int
+        Number of points of every stencil minus one.
+    order : int
+        Highest derivative needed.
+    points : array_like of shape (n_stencils, accuracy + 1)
+        Points of every stencil (in any order, the grid does not need to be uniform).
+    x0 : float or array_like of shape (n_stencils,)
+        Point where the derivatives are approximated for every stencil.
+
+    Returns
+    -------
+    coeffs : np.ndarray of shape (n_stencils, accuracy + 1, accuracy + 1, min(order, accuracy) + 1)
+        coeffs[s, n, nu, m] is the weight of points[s, nu] to approximate the derivative of
+        order m at x0[s] using the first n + 1 points of the stencil s.
+    """
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+    x0 = np.broadcast_to(np.asarray(x0, dtype=float), points.shape[:1])
+    m = np.arange(min(order, accuracy) + 1)
+    coeffs = np.zeros((len(points), accuracy + 1, accuracy + 1, len(m)))
+    coeffs[:, 0, 0, 0] = 1
+    c1 = np.ones(len(points))
     for n in range(accuracy):
         nt = n + 1
-        c2 = 1
+        c2 = np.ones(len(points))
         for nu in range(nt):
-            c3 = points[nt] - points[nu]
+            c3 = points[:, nt] - points[:, nu]
             c2 = c2 * c3
-            for m in range(min(nt, order) + 1):
-                if m == 0:
-                    coeffs[nt, nu, m] = ((points[nt] - x0) * coeffs[nt - 1, nu, m]) / c3
-                else:
-                    coeffs[nt, nu, m] = ((points[nt] - x0) * coeffs[nt - 1, nu, m] - m * coeffs[nt - 1, nu, m - 1]) / c3
-        for m in range(min(nt, order) + 1):
-            if m == 0:
-                coeffs[nt, nt, m] = c1 / c2 * (-(points[nt - 1] - x0) * coeffs[nt - 1, nt - 1, m])
-            else:
-                coeffs[nt, nt, m] = (
-                    c1 / c2 * (m * coeffs[nt - 1, nt - 1, m - 1] - (points[nt - 1] - x0) * coeffs[nt - 1, nt - 1, m])
-                )
+            previous = coeffs[:, nt - 1, nu]
+            coeffs[:, nt, nu] = ((points[:, nt] - x0)[:, None] * previous - m * _shift_order(previous)) / c3[:, None]
+        previous = coeffs[:, nt - 1, nt - 1]
+        last = m * _shift_order(previous) - (points[:, nt - 1] - x0)[:, None] * previous
+        coeffs[:, nt, nt] = (c1 / c2)[:, None] * last
         c1 = c2
     return coeffs
 
 
+def _shift_order(coeffs):
+    """Shift coefficients by one derivative order (last axis), the coefficients of order -1 being 0."""
+    shifted = np.zeros_like(coeffs)
+    shifted[..., 1:] = coeffs[..., :-1]
+    return shifted
+
+
+def _grid_weights(grid, order, n_points):
+    """Compute FD weights of a derivative at every node of a (possibly non-uniform) 1D grid.
+
+    Every node uses the n_points closest nodes (centered when possible, one-sided near
+    the boundaries), and all stencils are computed in a single call to _fornberg_batch.
+
+    Returns
+    -------
+    idx : np.ndarray of shape (len(grid), n_points)
+        Indices of the nodes used by every stencil.
+    weights : np.ndarray of shape (len(grid), n_points)
+        Weights to apply to grid values at idx to get the derivative of order "order".
+    """
+    grid = np.asarray(grid, dtype=float)
+    if n_points > len(grid) or n_points < order + 1:
+        raise ValueError(f"Can not approximate derivative {order} with {n_points} points on {len(grid)} nodes.")
+    start = np.clip(np.arange(len(grid)) - (n_points - 1) // 2, 0, len(grid) - n_points)
+    idx = start[:, None] + np.arange(n_points)
+    coeffs = _fornberg_batch(n_points - 1, order, grid[idx], grid)
+    return idx, coeffs[:, -1, :, order]
+
+
 def _to_exprlist(coeffs_at_order, points, name, step_size, time="imp", order_t=None):
     """Convert coefficients into expression and sorted dict.
 
@@ -117,6 +238,7 @@ def _to_exprlist(coeffs_at_order, points, name, step_size, time="imp", order_t=N
         for count, elem in enumerate(vec_at_idx):
             if elem != 0:
                 expr_idx += np.around(elem, decimals=2) * symb_ls[count]
+        expr_idx = postvisitor(expr_idx, simplify)  # Remove the leading 0 of the sum
         if der != 0:
             expr_idx /= h**der
             dic += ExpressionList({k: v for k, v in zip(points, vec_at_idx / h**der)})
@@ -125,7 +247,7 @@ def _to_exprlist(coeffs_at_order, points, name, step_size, time="imp", order_t=N
             expr = 0
         if expr_idx != 0:
             expr += expr_idx
-    dic = dic(step_size, name)
+    dic = dic.simplify()(step_size, name)
     return expr, dic, dic.max_key()
 
 
@@ -137,10 +259,28 @@ def _x_or_t_to_epxrlist(equation, method, name, step_size, acc=2, time="imp", or
     the algorythm and extracting the needed values from there. Last transforming
     these into Expression/Expressionlist which will be useful later.
 
+    The result is cached (keyed by all inputs, see STENCIL_CACHE_SIZE), an independent
+    copy of the ExpressionList is returned at every call. Stencils derived in other
+    processes can be added to the cache with seed_stencil_cache.
+
     See Also
     --------
     _to_expr : Third step is explained further.
     """
+    key = (tuple(equation), method, name, step_size, acc, time, order_t)
+    if key in _seeded_exprlists:
+        expr, coeffs, order_t = _seeded_exprlists[key]
+    else:
+        expr, coeffs, order_t = _cached_exprlist(*key)
+        _derived_keys[key] = None
+        if len(_derived_keys) > STENCIL_CACHE_SIZE:
+            del _derived_keys[next(iter(_derived_keys))]
+    return expr, ExpressionList._from_arrays(coeffs.offsets.copy(), coeffs.values.copy()), order_t
+
+
+@lru_cache(maxsize=STENCIL_CACHE_SIZE)
+def _cached_exprlist(equation, method, name, step_size, acc, time, order_t):
+    """Apply the three steps of _x_or_t_to_epxrlist."""
     order = len(equation) - 2
     if acc < order:
         accuracy = order + 2  # Accuracy should be big enough
@@ -227,7 +367,7 @@ def _equ_to_exprlist(equation, acc_x, acc_t, method_x=["cen"], method_t=["for"],
 
 
 def _exprlist_to_mat(mat_entries, time="imp"):
-    """Transform two dicts into arrays to fill the matrix/rhs later.
+    """Transform two ExpressionLists into arrays to fill the matrix/rhs later.
 
     In this function, we only take care of having the right type. The
     bulk of the transformation happening is in combine_x_and_t.
@@ -237,14 +377,11 @@ def _exprlist_to_mat(mat_entries, time="imp"):
     class ExpressionList : Detailed explanation/examples of combine_x_and_t.
     """
     x_entries, t_entries = mat_entries
-    mat_dict, rhs_x, rhs_t, bc_x = x_entries.combine_x_and_t(t_entries, time)
-    mat_array = np.transpose(np.array(list(mat_dict.items())))
-    dummy = np.array(list(rhs_t.items()))
-    rhs_t = np.transpose(dummy[dummy[:, 0].argsort()])
+    mat, rhs_x, rhs_t, bc_x = x_entries.combine_x_and_t(t_entries, time)
+    # ExpressionLists keep their offsets sorted, stacking them gives the [offsets; values] arrays directly
+    mat_array, rhs_t = (np.vstack((elem.offsets, elem.values)) for elem in (mat, rhs_t))
     if rhs_x is not None:
-        dummy = np.array(list(rhs_x.items()))
-        rhs_x = np.transpose(dummy[dummy[:, 0].argsort()])
+        rhs_x = np.vstack((rhs_x.offsets, rhs_x.values))
     if bc_x is not None:
-        dummy = np.array(list(bc_x.items()))
-        bc_x = np.transpose(dummy[dummy[:, 0].argsort()])
+        bc_x = np.vstack((bc_x.offsets, bc_x.values))
     return mat_array, rhs_x, rhs_t, bc_x